@@ -1,35 +1,347 @@
 import os
-import tempfile
-import shutil
 import json
 import gc
-import weakref
+import threading
+import zlib
+import zipfile
+from collections import OrderedDict
+from itertools import count
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import numpy as np
 from scipy.interpolate import splprep, splev
+from scipy import ndimage
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+    # Sin numba los kernels se ejecutan como Python/NumPy normal
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda func: func
+try:
+    import orjson
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+except ImportError:
+    # Sin orjson se usa el json de la biblioteca estándar
+    json_loads = json.loads
+    json_dumps = json.dumps
 import math
 from PyQt6.QtCore import Qt, QPoint, QPointF, QRect
 from PyQt6.QtGui import QPainter, QPen, QColor, QImage, QTransform, QCursor
 
 from PyQt6.QtCore import (
     QBuffer, QByteArray, QIODevice, Qt, QSize, QPoint, 
-    QPointF, QTimer, QRect
+    QPointF, QTimer, QRect, QRectF, QThread, QMutex, QMutexLocker, pyqtSignal,
+    QObject, QRunnable, QThreadPool, QElapsedTimer, QKeyCombination
 )
 
 from PyQt6.QtGui import (
     QImage, QShortcut, QKeySequence, QCursor, QPixmap, 
-    QPen, QPainterPath, QPainter, QColor, QAction, QIcon
+    QPen, QPainterPath, QPainter, QColor, QAction, QIcon, QPolygonF, QPixmapCache,
+    QPalette
 )
 
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QSplitter, QApplication, QMainWindow, 
     QHBoxLayout, QPushButton, QLabel, QListWidget, QListWidgetItem, 
-    QSlider, QScrollArea, QGridLayout, QColorDialog, QMessageBox, 
-    QFileDialog, QMenu, QInputDialog
+    QSlider, QScrollArea, QColorDialog, QMessageBox, 
+    QFileDialog, QMenu, QInputDialog, QButtonGroup
 )
+
+# Factor de conversión de radianes a grados (math.degrees sin la llamada extra)
+RAD_TO_DEG = 180.0 / math.pi
+
+# Trazos con menos puntos se suavizan con smooth_path en lugar de SciPy
+SMOOTH_KERNEL_MAX_POINTS = 256
+
+# A partir de esta cantidad de muestras el trazo se trata como de tableta
+TABLET_MIN_POINTS = 150
+
+# Desvío máximo (px) respecto de una recta para dibujar el trazo sin suavizar
+STRAIGHT_STROKE_TOLERANCE = 0.5
+
+# Lado (px) de las miniaturas del grid de frames
+THUMBNAIL_SIZE = 28
+
+# Límite (KB) de QPixmapCache, donde se guardan las miniaturas
+THUMBNAIL_CACHE_KB = 64 * 1024
+
+# Intervalo (ms) de los timers que agrupan eventos: un fotograma de
+# pantalla a ~60 Hz
+FRAME_INTERVAL_MS = 16
+
+# Memoria máxima para composiciones cacheadas durante la reproducción
+PLAYBACK_CACHE_BYTES = 256 * 1024 * 1024
+
+# Calidad de QImage.save para los PNG exportados (0 = máxima compresión
+# zlib, 100 = ninguna). El valor por defecto comprime más lento para
+# ganar apenas un par de por ciento de tamaño
+EXPORT_PNG_QUALITY = 50
+
+
+@njit(cache=True)
+def smooth_path(xs, ys, tension, samples):
+    """
+    Evalúa una curva cúbica uniforme sobre los puntos de un trazo.
+    tension=0 pasa por los puntos (Catmull-Rom) y tension=1 los aproxima
+    con una B-spline cúbica, que suaviza más. Devuelve (xs, ys) con
+    samples puntos por segmento.
+    """
+    n = xs.shape[0]
+    if n < 2:
+        return xs.copy(), ys.copy()
+    
+    # Puntos fantasma reflejados en los extremos: la curva empieza y
+    # termina exactamente en el primer y último punto del trazo
+    px = np.empty(n + 2)
+    py = np.empty(n + 2)
+    px[1:n + 1] = xs
+    py[1:n + 1] = ys
+    px[0] = 2.0 * xs[0] - xs[1]
+    py[0] = 2.0 * ys[0] - ys[1]
+    px[n + 1] = 2.0 * xs[n - 1] - xs[n - 2]
+    py[n + 1] = 2.0 * ys[n - 1] - ys[n - 2]
+    
+    out_x = np.empty((n - 1) * samples + 1)
+    out_y = np.empty((n - 1) * samples + 1)
+    idx = 0
+    for seg in range(n - 1):
+        # El último segmento también evalúa t=1 para cerrar en el extremo
+        steps = samples + 1 if seg == n - 2 else samples
+        for k in range(steps):
+            t = k / samples
+            t2 = t * t
+            t3 = t2 * t
+            # Base Catmull-Rom
+            c0 = 0.5 * (-t3 + 2.0 * t2 - t)
+            c1 = 0.5 * (3.0 * t3 - 5.0 * t2 + 2.0)
+            c2 = 0.5 * (-3.0 * t3 + 4.0 * t2 + t)
+            c3 = 0.5 * (t3 - t2)
+            # Base B-spline cúbica
+            b0 = (1.0 - t) ** 3 / 6.0
+            b1 = (3.0 * t3 - 6.0 * t2 + 4.0) / 6.0
+            b2 = (-3.0 * t3 + 3.0 * t2 + 3.0 * t + 1.0) / 6.0
+            b3 = t3 / 6.0
+            w0 = c0 + tension * (b0 - c0)
+            w1 = c1 + tension * (b1 - c1)
+            w2 = c2 + tension * (b2 - c2)
+            w3 = c3 + tension * (b3 - c3)
+            out_x[idx] = (w0 * px[seg] + w1 * px[seg + 1] +
+                          w2 * px[seg + 2] + w3 * px[seg + 3])
+            out_y[idx] = (w0 * py[seg] + w1 * py[seg + 1] +
+                          w2 * py[seg + 2] + w3 * py[seg + 3])
+            idx += 1
+    return out_x, out_y
+
+
+@njit(cache=True)
+def _color_matches(pixels, y, x, start_bgra, tolerance):
+    for c in range(4):
+        if abs(np.int32(pixels[y, x, c]) - np.int32(start_bgra[c])) > tolerance:
+            return False
+    return True
+
+
+@njit(cache=True)
+def flood_fill_scanline(pixels, sx, sy, start_bgra, fill_bgra, tolerance):
+    """
+    Rellena in situ la región 8-conexa que contiene (sx, sy) en un buffer
+    BGRA (alto, ancho, 4), recorriendo tramos horizontales completos y
+    apilando solo el inicio de cada tramo vecino. Un píxel pertenece a la
+    región si cada canal difiere de start_bgra en a lo sumo tolerance.
+    Devuelve el rectángulo rellenado como (izquierda, arriba, derecha, abajo),
+    vacío (derecha < izquierda) si no se rellenó nada.
+    """
+    height, width = pixels.shape[0], pixels.shape[1]
+    visited = np.zeros((height, width), np.bool_)
+    stack = [(sx, sy)]
+    min_x, min_y, max_x, max_y = width, height, -1, -1
+    
+    while len(stack) > 0:
+        x, y = stack.pop()
+        if visited[y, x] or not _color_matches(pixels, y, x, start_bgra, tolerance):
+            continue
+        
+        # Extender el tramo hacia ambos lados
+        left = x
+        while left > 0 and not visited[y, left - 1] and \
+                _color_matches(pixels, y, left - 1, start_bgra, tolerance):
+            left -= 1
+        right = x
+        while right < width - 1 and not visited[y, right + 1] and \
+                _color_matches(pixels, y, right + 1, start_bgra, tolerance):
+            right += 1
+        
+        for i in range(left, right + 1):
+            visited[y, i] = True
+            for c in range(4):
+                pixels[y, i, c] = fill_bgra[c]
+        min_x, max_x = min(min_x, left), max(max_x, right)
+        min_y, max_y = min(min_y, y), max(max_y, y)
+        
+        # Filas vecinas, una columna más a cada lado para incluir diagonales
+        for ny in (y - 1, y + 1):
+            if ny < 0 or ny >= height:
+                continue
+            in_run = False
+            for i in range(max(left - 1, 0), min(right + 1, width - 1) + 1):
+                if not visited[ny, i] and _color_matches(pixels, ny, i, start_bgra, tolerance):
+                    if not in_run:
+                        stack.append((i, ny))
+                        in_run = True
+                else:
+                    in_run = False
+    return min_x, min_y, max_x, max_y
+
+
+if HAVE_NUMBA:
+    # Compilar (o cargar de la caché) al importar, no en el primer clic del balde
+    flood_fill_scanline(np.zeros((1, 1, 4), np.uint8), 0, 0,
+                        np.zeros(4, np.int16), np.zeros(4, np.uint8), 0)
+    # Igual para el suavizado, que si no se compila al soltar el primer trazo
+    smooth_path(np.zeros(2), np.zeros(2), 0.5, 2)
+
+# Snapshots de undo seguidos que pueden guardarse como XOR contra el
+# anterior antes de volver a guardar un frame completo
+UNDO_DELTA_CHAIN = 8
+
+# Un frame transparente ya rellenado por tamaño; los frames vacíos son
+# copias superficiales que comparten su buffer hasta que se pinta en ellos
+_blank_frames = OrderedDict()
+_BLANK_FRAMES_LIMIT = 16
+
+
+def blank_frame(width, height):
+    """
+    Devuelve un frame transparente de width x height. No reserva ni
+    limpia memoria: Qt copia el buffer compartido recién cuando el frame
+    se modifica (QPainter, fill, bits), así que los frames que nunca se
+    dibujan no ocupan memoria propia.
+    """
+    key = (width, height)
+    template = _blank_frames.get(key)
+    if template is None:
+        template = QImage(width, height, QImage.Format.Format_ARGB32_Premultiplied)
+        template.fill(Qt.GlobalColor.transparent)
+        _blank_frames[key] = template
+        if len(_blank_frames) > _BLANK_FRAMES_LIMIT:
+            _blank_frames.popitem(last=False)
+    else:
+        _blank_frames.move_to_end(key)
+    return QImage(template)
+
+
+def coalescing_timer(parent, ms, slot):
+    """
+    Timer de un disparo que llama a slot ms milisegundos después de
+    start(). Sirve para agrupar ráfagas de eventos en una sola llamada.
+    """
+    timer = QTimer(parent)
+    timer.setSingleShot(True)
+    timer.setInterval(ms)
+    timer.timeout.connect(slot)
+    return timer
+
+
+# Frames decodificados que se conservan a cada lado del frame actual en
+# las capas abiertas desde archivo; los demás vuelven a su PNG
+LAZY_FRAME_WINDOW = 16
+
+# Claves estables de los PNG de LazyFrames. Son negativas para no chocar
+# con cacheKey(), que cambia cada vez que el PNG se decodifica de nuevo
+_png_keys = count(1)
+
+
+class LazyFrames(list):
+    """
+    Lista de frames que puede guardar PNG sin decodificar (bytes) en lugar
+    de QImage. Un frame se decodifica la primera vez que se lee y queda
+    en la lista; release() devuelve a su PNG los frames lejanos que no se
+    modificaron, así abrir un archivo grande no carga todo en memoria.
+    frame_key() identifica el contenido sin decodificar y se mantiene
+    igual entre liberaciones, para las cachés de miniaturas y composición.
+    """
+
+    def __init__(self, frames=()):
+        super().__init__(frames)
+        # cacheKey() del frame decodificado -> PNG del que salió
+        self._sources = {}
+        # id(PNG) -> (PNG, clave estable); guardar el PNG evita que su id se reuse
+        self._png_keys = {}
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        frame = super().__getitem__(index)
+        if isinstance(frame, bytes):
+            png = frame
+            frame = Layer.frame_from_png(png)
+            super().__setitem__(index, frame)
+            self._sources[frame.cacheKey()] = png
+        return frame
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def raw(self):
+        """Los elementos tal como están guardados, sin decodificar"""
+        return super().__iter__()
+
+    def source(self, index):
+        """El elemento en index tal como está guardado (QImage o PNG)"""
+        return super().__getitem__(index)
+
+    def frame_key(self, index):
+        """
+        Clave del contenido del frame en index, sin decodificarlo: la del
+        PNG si el frame sigue intacto desde que salió de uno, si no su cacheKey()
+        """
+        frame = super().__getitem__(index)
+        if isinstance(frame, bytes):
+            png = frame
+        else:
+            png = self._sources.get(frame.cacheKey())
+            if png is None:
+                return frame.cacheKey()
+        entry = self._png_keys.get(id(png))
+        if entry is None:
+            entry = self._png_keys[id(png)] = (png, -next(_png_keys))
+        return entry[1]
+
+    def release(self, keep):
+        """
+        Vuelve a PNG los frames que siguen intactos desde que se
+        decodificaron, salvo los de los rangos en keep: Qt cambia el
+        cacheKey() al pintarlos, así que un frame editado nunca se descarta.
+        """
+        sources = {}
+        pngs = set()
+        for i, frame in enumerate(self.raw()):
+            if isinstance(frame, bytes):
+                pngs.add(id(frame))
+                continue
+            png = self._sources.get(frame.cacheKey())
+            if png is None:
+                continue
+            pngs.add(id(png))
+            if any(i in indices for indices in keep):
+                sources[frame.cacheKey()] = png
+            else:
+                super().__setitem__(i, png)
+        self._sources = sources
+        self._png_keys = {key: entry for key, entry in self._png_keys.items() if key in pngs}
+
+
 class Layer:
     def __init__(self, width, height, index=0, name="Nueva Capa"):
         self.index = index
-        self.frames = {}
+        # Frames en orden, indexados densamente desde 0
+        self.frames = []
         self.width = width
         self.height = height
         self.visible = True
@@ -39,60 +351,244 @@ class Layer:
         self.selected = False
         self.undo_stack = []
         self.redo_stack = []
-        self._init_first_frame()
         # Optimized memory management
-        
-        self.max_undo_states = 10
-        self._frame_cache = weakref.WeakValueDictionary()
+        # El historial guarda los frames comprimidos y se limita por bytes
+        self.max_undo_bytes = 64 * 1024 * 1024
+        # LRU cacheKey() -> snapshot comprimido, evita recomprimir frames sin cambios
+        self._frame_cache = OrderedDict()
+        self._frame_cache_limit = 64
+        # Bytes comprimidos retenidos por undo/redo, llevados al día al
+        # entrar y salir estados: id(snapshot) -> [referencias, snapshot]
+        self._history_refs = {}
+        self._history_total = 0
+        # (snapshot, bytes crudos) del último frame comprimido: base del próximo delta
+        self._last_packed_raw = None
         self._init_first_frame()
 
     def _init_first_frame(self):
-        frame = QImage(self.width, self.height, QImage.Format.Format_ARGB32_Premultiplied)
-        frame.fill(Qt.GlobalColor.transparent)  # Cambiamos a transparente
-        self.frames[0] = frame
+        self.set_frame(0, self._blank_frame())
         self._save_state()
+
+    def _blank_frame(self):
+        return blank_frame(self.width, self.height)
     def optimize_memory(self):
         """Force memory optimization"""
         self._cleanup_inactive_frames()
         self._clean_save_state()
         gc.collect()
+    @property
+    def opacity(self):
+        return self._opacity
+
+    @opacity.setter
+    def opacity(self, value):
+        # Guardar también la fracción 0-1 que usa setOpacity al componer
+        self._opacity = value
+        self._opacity_f = value / 100.0
+
     def _save_state(self):
         """Guarda el estado actual de la capa para undo/redo"""
         if self.frames:
-            frame_copies = {k: v.copy() for k, v in self.frames.items()}
-            # Limitar el tamaño del stack para evitar uso excesivo de memoria
-            if len(self.undo_stack) > 20:  # mantener máximo 20 estados
-                self.undo_stack.pop(0)
-            self.undo_stack.append(frame_copies)
+            previous = self.undo_stack[-1] if self.undo_stack else []
+            # La caché debe cubrir todos los frames de la capa, si no cada
+            # guardado recomprimiría los que el LRU ya descartó
+            self._frame_cache_limit = max(self._frame_cache_limit, 2 * len(self.frames))
+            # Sin decodificar: los frames que siguen en PNG se guardan tal cual
+            frames = self.frames.raw() if isinstance(self.frames, LazyFrames) else self.frames
+            snapshot = [
+                self._pack_frame(frame, previous[i] if i < len(previous) else None)
+                for i, frame in enumerate(frames)
+            ]
+            self.undo_stack.append(snapshot)
+            self._retain_state(snapshot)
+            for state in self.redo_stack:
+                self._release_state(state)
             self.redo_stack.clear()
+            # Limitar el historial por memoria, conservando siempre el estado actual
+            while len(self.undo_stack) > 2 and self._history_total > self.max_undo_bytes:
+                self._release_state(self.undo_stack.pop(0))
+
+    def _pack_frame(self, frame, base=None):
+        """
+        Comprime los bytes crudos de un frame, reutilizando el snapshot si no
+        cambió. Si hay un snapshot base compatible (el mismo frame en el estado
+        anterior) se comprime el XOR contra él: un trazo deja casi todo en
+        cero y el snapshot ocupa unos pocos KB aunque el frame esté lleno.
+        Un frame que sigue como PNG ya está comprimido y es su propio snapshot.
+        """
+        if isinstance(frame, bytes):
+            return frame
+        key = frame.cacheKey()
+        packed = self._frame_cache.get(key)
+        if packed is not None:
+            self._frame_cache.move_to_end(key)
+            return packed
+        
+        ptr = frame.constBits()
+        ptr.setsize(frame.sizeInBytes())
+        raw = bytes(ptr)
+        header = (frame.width(), frame.height(), frame.bytesPerLine(), frame.format())
+        if isinstance(base, tuple) and base[:4] == header and base[6] < UNDO_DELTA_CHAIN:
+            delta = np.bitwise_xor(np.frombuffer(raw, np.uint8),
+                                   np.frombuffer(self._packed_bytes(base), np.uint8))
+            packed = header + (zlib.compress(delta.tobytes(), 1), base, base[6] + 1)
+        else:
+            packed = header + (zlib.compress(raw, 1), None, 0)
+        self._last_packed_raw = (packed, raw)
+        self._frame_cache[key] = packed
+        if len(self._frame_cache) > self._frame_cache_limit:
+            self._frame_cache.popitem(last=False)
+        return packed
+
+    def _packed_bytes(self, packed):
+        """Bytes crudos de un snapshot, deshaciendo la cadena de deltas"""
+        if self._last_packed_raw is not None and self._last_packed_raw[0] is packed:
+            return self._last_packed_raw[1]
+        data, base = packed[4], packed[5]
+        if base is None:
+            return zlib.decompress(data)
+        return np.bitwise_xor(np.frombuffer(zlib.decompress(data), np.uint8),
+                              np.frombuffer(self._packed_bytes(base), np.uint8)).tobytes()
+
+    def _snapshot_of(self, frame):
+        """El snapshot ya guardado de un frame sin cambios, o None"""
+        if isinstance(frame, bytes):
+            return frame
+        key = frame.cacheKey()
+        packed = self._frame_cache.get(key)
+        if packed is None and isinstance(self.frames, LazyFrames):
+            # Decodificado de un PNG y todavía intacto
+            packed = self.frames._sources.get(key)
+        return packed
+
+    def _unpack_frame(self, packed):
+        """Reconstruye un QImage independiente desde un snapshot comprimido"""
+        if isinstance(packed, bytes):
+            # PNG: LazyFrames lo decodifica cuando se lea
+            return packed
+        width, height, bytes_per_line, image_format = packed[:4]
+        frame = QImage(self._packed_bytes(packed), width, height,
+                       bytes_per_line, image_format).copy()
+        # El frame restaurado tiene otro cacheKey(): registrarlo para que el
+        # próximo guardado reutilice este snapshot en lugar de recomprimir
+        self._frame_cache[frame.cacheKey()] = packed
+        if len(self._frame_cache) > self._frame_cache_limit:
+            self._frame_cache.popitem(last=False)
+        return frame
+
+    def _reset_history(self):
+        """
+        Descarta el historial y toma los frames actuales como estado
+        inicial (al cargar desde archivo). Los frames en PNG son su propio
+        snapshot, así que no se comprime nada.
+        """
+        for state in self.undo_stack + self.redo_stack:
+            self._release_state(state)
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self._save_state()
+
+    def _retain_state(self, state):
+        """Suma al total del historial los snapshots de un estado que entra"""
+        for packed in state:
+            # Las bases de los deltas siguen vivas aunque su estado ya no esté
+            while packed is not None:
+                entry = self._history_refs.get(id(packed))
+                if entry is not None:
+                    entry[0] += 1
+                    break
+                self._history_refs[id(packed)] = [1, packed]
+                if isinstance(packed, bytes):
+                    self._history_total += len(packed)
+                    break
+                self._history_total += len(packed[4])
+                packed = packed[5]
+
+    def _release_state(self, state):
+        """Resta del total los snapshots que ya no retiene ningún estado"""
+        for packed in state:
+            while packed is not None:
+                entry = self._history_refs[id(packed)]
+                entry[0] -= 1
+                if entry[0]:
+                    break
+                del self._history_refs[id(packed)]
+                if isinstance(packed, bytes):
+                    self._history_total -= len(packed)
+                    break
+                self._history_total -= len(packed[4])
+                packed = packed[5]
 
     def add_frame(self, index=None):
         # Asegurarse de usar las dimensiones actuales de la capa
-        new_frame = QImage(self.width, self.height, QImage.Format.Format_ARGB32_Premultiplied)
-        new_frame.fill(Qt.GlobalColor.transparent)
-        
-        if index is None:
-            new_index = max(self.frames.keys()) + 1 if self.frames else 0
-        else:
-            new_index = index
-        
-        self.frames[new_index] = new_frame
+        new_index = len(self.frames) if index is None else index
+        self.set_frame(new_index, self._blank_frame())
         self._save_state()
         return new_index
 
+    def set_frame(self, index, frame):
+        """
+        Pone frame en la posición index. Si la capa es más corta, los
+        huecos intermedios se rellenan con frames vacíos.
+        """
+        while len(self.frames) < index:
+            self.frames.append(self._blank_frame())
+        if index < len(self.frames):
+            self.frames[index] = frame
+        else:
+            self.frames.append(frame)
+
+    def frame_at(self, index):
+        """El frame en index, o None si la capa no llega hasta ahí"""
+        return self.frames[index] if 0 <= index < len(self.frames) else None
+
+    def frame_key(self, index):
+        """
+        Clave del contenido del frame en index para las cachés, o None si la
+        capa no llega hasta ahí. No decodifica los frames que siguen en PNG.
+        """
+        if not 0 <= index < len(self.frames):
+            return None
+        if isinstance(self.frames, LazyFrames):
+            return self.frames.frame_key(index)
+        return self.frames[index].cacheKey()
+
+    def frame_source(self, index):
+        """El frame en index sin decodificar: un QImage o los bytes de su PNG"""
+        if isinstance(self.frames, LazyFrames):
+            return self.frames.source(index)
+        return self.frames[index]
+
+    def frame_pngs(self):
+        """Cada frame como PNG, reusando los que todavía no se decodificaron"""
+        frames = self.frames.raw() if isinstance(self.frames, LazyFrames) else self.frames
+        for frame in frames:
+            yield frame if isinstance(frame, bytes) else self.frame_png(frame)
+
+    def release_frames(self, center, visible=None):
+        """
+        Descarta los frames decodificados lejos de center (ver LazyFrames),
+        salvo los del rango [primero, último) visible, si se indica
+        """
+        if isinstance(self.frames, LazyFrames):
+            keep = [range(center - LAZY_FRAME_WINDOW, center + LAZY_FRAME_WINDOW + 1)]
+            if visible is not None:
+                keep.append(range(*visible))
+            self.frames.release(keep)
+
     def get_frame(self, index):
-        if index not in self.frames:
+        if index >= len(self.frames):
             self.add_frame(index)
         return self.frames[index]
 
     def update_frame(self, index, image):
-        if index not in self.frames:
+        if index >= len(self.frames):
             self.add_frame(index)
         self.frames[index] = image.copy()
         self._save_state()
 
     def copy_frame(self, frame_index):
-        if frame_index in self.frames:
+        if frame_index < len(self.frames):
             return self.frames[frame_index].copy()
         return None
 
@@ -102,21 +598,41 @@ class Layer:
             current_state = self.undo_stack.pop()
             self.redo_stack.append(current_state)
             previous_state = self.undo_stack[-1]
-            self.frames = {k: v.copy() for k, v in previous_state.items()}
+            self._restore_frames(previous_state)
             return True
         return False
 
     def redo(self):
         if self.redo_stack:
             state = self.redo_stack.pop()
-            self.undo_stack.append({k: v.copy() for k, v in state.items()})
-            self.frames = {k: v.copy() for k, v in state.items()}
+            # Los snapshots son inmutables: no hace falta copiarlos
+            self.undo_stack.append(state)
+            self._restore_frames(state)
             return True
         return False
+
+    def _restore_frames(self, state):
+        """
+        Reemplaza los frames por los de un snapshot del historial. Los frames
+        que ya coinciden con su snapshot se conservan tal cual: solo se
+        descomprimen los que la acción deshecha o rehecha cambió.
+        """
+        live = list(self.frames.raw()) if isinstance(self.frames, LazyFrames) else self.frames
+        frames = LazyFrames(
+            live[i] if i < len(live) and self._snapshot_of(live[i]) is packed
+            else self._unpack_frame(packed)
+            for i, packed in enumerate(state)
+        )
+        if isinstance(self.frames, LazyFrames):
+            # Los frames que siguen decodificados de un PNG se pueden seguir
+            # descartando; release() olvida los que ya no estén
+            frames._sources.update(self.frames._sources)
+            frames._png_keys.update(self.frames._png_keys)
+        self.frames = frames
       
-    def to_dict(self):
-        """Convierte la capa a un diccionario para serialización"""
-        layer_data = {
+    def meta_dict(self):
+        """Propiedades de la capa sin los frames (manifiesto del archivo .anim)"""
+        return {
             'index': self.index,
             'width': self.width,
             'height': self.height,
@@ -125,19 +641,50 @@ class Layer:
             'name': self.name,
             'locked': self.locked,
             'selected': self.selected,
-            'frames': {}
+            'frame_count': len(self.frames)
         }
+
+    def to_dict(self):
+        """Convierte la capa a un diccionario para serialización"""
+        layer_data = self.meta_dict()
         
         # Convertir frames a base64
-        for frame_idx, frame in self.frames.items():
-            buffer = QBuffer()
-            buffer.open(QIODevice.OpenModeFlag.WriteOnly)
-            frame.save(buffer, "PNG")
-            layer_data['frames'][str(frame_idx)] = buffer.data().toBase64().data().decode()
-            buffer.close()
-            
+        layer_data['frames'] = {
+            str(frame_idx): QByteArray(png).toBase64().data().decode()
+            for frame_idx, png in enumerate(self.frame_pngs())
+        }
         return layer_data
 
+    @staticmethod
+    def frame_png(frame):
+        """Codifica un frame como PNG"""
+        buffer = QBuffer()
+        buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+        frame.save(buffer, "PNG")
+        buffer.close()
+        return buffer.data().data()
+
+    @staticmethod
+    def frame_from_png(byte_data):
+        """Decodifica un frame guardado como PNG"""
+        frame = QImage()
+        frame.loadFromData(byte_data, "PNG")
+        # El PNG se carga como ARGB32; en premultiplicado cada capa se
+        # combina con SourceOver directo, sin convertir en cada dibujo
+        return frame.convertToFormat(QImage.Format.Format_ARGB32_Premultiplied)
+
+    @classmethod
+    def from_archive(cls, data, archive, layer_idx):
+        """
+        Crea una capa desde su entrada del manifiesto y los PNG del archivo
+        .anim. Los PNG se leen pero no se decodifican hasta usarse.
+        """
+        layer = cls.from_dict(data)
+        for frame_idx in range(data['frame_count']):
+            layer.set_frame(frame_idx, archive.read(f"l{layer_idx}/f{frame_idx}.png"))
+        layer._reset_history()
+        return layer
+
     @classmethod
     def from_dict(cls, data):
         """Crea una nueva capa desde un diccionario"""
@@ -152,12 +699,14 @@ class Layer:
         layer.locked = data['locked']
         layer.selected = data.get('selected', False)
         
-        # Restaurar frames desde base64
-        for frame_idx, frame_data in data['frames'].items():
+        # Los frames se guardan como PNG y se decodifican al leerlos
+        layer.frames = LazyFrames(layer.frames)
+        
+        # Restaurar frames desde base64 (formato JSON anterior)
+        for frame_idx, frame_data in data.get('frames', {}).items():
             byte_data = QByteArray.fromBase64(frame_data.encode())
-            frame = QImage()
-            frame.loadFromData(byte_data, "PNG")
-            layer.frames[int(frame_idx)] = frame
+            layer.set_frame(int(frame_idx), byte_data.data())
+        layer._reset_history()
             
         return layer
 
@@ -168,12 +717,60 @@ class Layer:
             index=self.index,
             name=self.name + " (copia)"
         )
-        new_layer.frames = {k: v.copy() for k, v in self.frames.items()}
+        new_layer.frames = [frame.copy() for frame in self.frames]
         new_layer.visible = self.visible
         new_layer.opacity = self.opacity
         new_layer.locked = self.locked
         return new_layer
 
+class CompositorThread(QThread):
+    """
+    Compone frames fuera del hilo de la interfaz.
+    Solo guarda la última petición: si llegan varias mientras compone,
+    las intermedias se descartan. El hilo termina al quedarse sin trabajo
+    y vuelve a arrancar con la siguiente petición.
+    """
+    frameReady = pyqtSignal(int, QImage)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._mutex = QMutex()
+        self._pending = None
+        self._busy = False
+
+    def request(self, token, job):
+        with QMutexLocker(self._mutex):
+            self._pending = (token, job)
+            if self._busy:
+                return
+            self._busy = True
+        # Puede estar terminando la vuelta anterior de run()
+        self.wait()
+        self.start()
+
+    def run(self):
+        while True:
+            with QMutexLocker(self._mutex):
+                if self._pending is None:
+                    self._busy = False
+                    return
+                token, job = self._pending
+                self._pending = None
+            self.frameReady.emit(token, self.compose(*job[2:]))
+
+    @staticmethod
+    def compose(size, background_color, images):
+        """Combina (imagen, opacidad) de abajo hacia arriba sobre el fondo"""
+        # Imagen opaca: sin alfa destino, Qt usa el camino de mezcla más rápido
+        temp_image = QImage(size, QImage.Format.Format_RGB32)
+        temp_image.fill(background_color)
+        painter = QPainter(temp_image)
+        for image, opacity in images:
+            painter.setOpacity(opacity)
+            painter.drawImage(0, 0, image)
+        painter.end()
+        return temp_image
+
 class AnimationCanvas(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -182,6 +779,8 @@ class AnimationCanvas(QWidget):
         self.current_layer = 0
         self.current_frame = 0
         self.layers = []
+        # Ventana principal, la asigna AnimationApp al crear el canvas
+        self._main_window = None
         self.selection_tool = SelectionTool()
         self.current_tool = "pencil"
         self.smoothing_factor = 50
@@ -195,6 +794,60 @@ class AnimationCanvas(QWidget):
         self.pen_size = 3
         self.pen_opacity = 255
         self.aa_manager = AntiAliasingManager()
+        # Composición cacheada de las capas bajo la capa activa,
+        # indexada por (frame, capa activa)
+        self._below_cache = {}
+        self._below_cache_limit = 8
+        # Frames teñidos del papel cebolla (LRU), indexados por
+        # (Layer.frame_key del frame, color del tinte)
+        self._onion_tint_cache = OrderedDict()
+        self._onion_tint_cache_limit = 64
+        # Papel cebolla ya compuesto en una sola imagen por frame actual
+        self._onion_cache = {}
+        self._onion_cache_limit = 8
+        # Composición final por frame (LRU), para volver a frames ya vistos
+        # sin recombinar las capas
+        self._frame_composite_cache = OrderedDict()
+        self._frame_composite_cache_limit = 32
+        self._frame_composite_cache_default = self._frame_composite_cache_limit
+        self._playing = False
+        # Los frames lejanos de capas abiertas desde archivo vuelven a PNG
+        # recién cuando el usuario se detiene en un frame, nunca al reproducir:
+        # volver a decodificarlos en cada vuelta sería trabajo perdido
+        self._release_timer = coalescing_timer(self, 500, self._release_far_frames)
+        # La composición del frame actual se hace en segundo plano; el token
+        # descarta resultados de peticiones ya superadas
+        self.current_frame_image = None
+        self._composite_token = 0
+        self._compositor = CompositorThread(self)
+        self._compositor.frameReady.connect(self._on_composite_ready)
+        QApplication.instance().aboutToQuit.connect(self._compositor.wait)
+        # Las peticiones de redibujo se agrupan: varias llamadas seguidas a
+        # draw_current_frame (cambios en cadena del timeline, por ejemplo)
+        # componen una sola vez en la siguiente vuelta del event loop
+        self._composite_timer = coalescing_timer(self, 0, self._compose_current_frame)
+        # Zona del widget a repintar cuando llegue la próxima composición;
+        # None con _dirty_full en False significa que no hay nada pendiente
+        self._dirty_rect = None
+        self._dirty_full = False
+        # Las muestras del mouse se acumulan y el trazo se pinta como mucho
+        # una vez por fotograma de pantalla
+        self._stroke_timer = coalescing_timer(self, FRAME_INTERVAL_MS, self._flush_stroke_preview)
+        # Vista previa del trazo en curso: se pinta solo el tramo nuevo sobre
+        # esta capa transparente y el frame no se toca hasta soltar el mouse.
+        # Con la goma es en cambio una copia del frame, hecha una vez por
+        # trazo, sobre la que se borra cada tramo nuevo
+        self._stroke_overlay = None
+        # Segmentos cúbicos del trazo ya calculados y aún no pintados;
+        # _committed_index es el primer punto sin segmento
+        self._committed_path = QPainterPath()
+        self._committed_index = 0
+        # Zona cubierta por la vista previa, para repintarla al soltar
+        self._stroke_bounds = QRectF()
+        # Muestras del trazo como filas (x, y); el buffer se reutiliza entre
+        # trazos y solo las primeras _point_count filas son válidas
+        self.current_points = np.empty((1024, 2), np.float64)
+        self._point_count = 0
         
         # Configuración del widget
         self.setFocusPolicy(Qt.FocusPolicy.StrongFocus)
@@ -210,6 +863,8 @@ class AnimationCanvas(QWidget):
         
         # Initialize canvas
         self._init_canvas()
+        self._refresh_max_frame_count()
+        self.draw_current_frame()
 
     def setup_cursors(self):
         """Configura los cursores para todas las herramientas"""
@@ -271,7 +926,7 @@ class AnimationCanvas(QWidget):
             return
             
         layer = self.layers[self.current_layer]
-        if self.current_frame not in layer.frames:
+        if self.current_frame >= len(layer.frames):
             return
             
         # Obtener color bajo el cursor
@@ -297,6 +952,24 @@ class AnimationCanvas(QWidget):
         first_layer = Layer(800, 600)
         self.layers.append(first_layer)
 
+    def _refresh_max_frame_count(self):
+        """
+        Recalcula la cantidad de frames de la capa más larga.
+        Se llama al agregar o quitar frames o capas, así el resto del
+        código la lee como un atributo en lugar de recorrer las capas.
+        """
+        self._max_frame_count = max((len(layer.frames) for layer in self.layers), default=0)
+
+    def _frames_grew(self, length):
+        """Una capa pasó a tener length frames: el máximo solo puede subir"""
+        if length > self._max_frame_count:
+            self._max_frame_count = length
+
+    def _frames_shrank(self, old_length):
+        """Una capa perdió frames: solo hay que recorrer si era la más larga"""
+        if old_length >= self._max_frame_count:
+            self._refresh_max_frame_count()
+
     def get_current_frame(self):
         if self.layers and self.current_layer < len(self.layers):
             layer = self.layers[self.current_layer]
@@ -314,7 +987,7 @@ class AnimationCanvas(QWidget):
             return
             
         current_layer = self.layers[self.current_layer]
-        if current_layer.locked or self.current_frame not in current_layer.frames:
+        if current_layer.locked or self.current_frame >= len(current_layer.frames):
             return
             
         current_frame = current_layer.frames[self.current_frame]
@@ -329,7 +1002,7 @@ class AnimationCanvas(QWidget):
             return
             
         current_layer = self.layers[self.current_layer]
-        if current_layer.locked or self.current_frame not in current_layer.frames:
+        if current_layer.locked or self.current_frame >= len(current_layer.frames):
             return
             
         current_frame = current_layer.frames[self.current_frame]
@@ -339,37 +1012,241 @@ class AnimationCanvas(QWidget):
         painter.end()
         self.draw_current_frame()  # Cambiar update() por draw_current_frame()
 
-    def draw_current_frame(self):
-        # Crear una imagen temporal para combinar todas las capas
-        temp_image = QImage(self.size(), QImage.Format.Format_ARGB32_Premultiplied)
-        temp_image.fill(Qt.GlobalColor.transparent)
-        painter = QPainter(temp_image)
+    def draw_current_frame(self, dirty_rect=None):
+        """
+        Pide componer el frame actual y mostrarlo. dirty_rect (coordenadas
+        del lienzo) limita el repintado a la zona modificada; sin él se
+        repinta todo el widget.
+        """
+        self._mark_dirty(dirty_rect)
+        if self.current_frame_image is None:
+            # Primer frame: no hay nada que mostrar mientras tanto
+            self._compose_current_frame()
+        elif not self._composite_timer.isActive():
+            self._composite_timer.start()
+
+    def _compose_current_frame(self):
+        """Compone el frame actual con el estado de este momento"""
+        onion_image = self._get_onion_overlay() if self.onion_skin_enabled else None
+        
+        # Reutilizar la composición del frame si nada de lo que la forma cambió.
+        # Las vistas previas de la selección y del trazo no se guardan
+        previewing = self._is_previewing_selection() or self._stroke_overlay is not None
+        signature = None
+        if not previewing:
+            signature = (
+                self.size(), self.background_color.rgba(),
+                onion_image.cacheKey() if onion_image is not None else None,
+            ) + tuple(
+                (id(layer), layer.visible, layer.opacity,
+                 layer.frame_key(self.current_frame))
+                for layer in self.layers
+            )
+            cached = self._frame_composite_cache.get(self.current_frame)
+            if cached is not None and cached[0] == signature:
+                self._frame_composite_cache.move_to_end(self.current_frame)
+                # Una composición en curso ya no corresponde a lo que se ve
+                self._composite_token += 1
+                self.current_frame_image = cached[1]
+                self._flush_dirty()
+                return
+        
+        # Cualquier resultado pendiente queda obsoleto
+        self._composite_token += 1
+        
+        # El papel cebolla queda entre el fondo y las capas
+        images = []
+        if onion_image is not None:
+            images.append((onion_image, 1.0))
+        
+        # Las capas bajo la activa no cambian mientras se dibuja sobre ella:
+        # se pinta su composición cacheada en un solo paso
+        below_image = self._get_below_composite()
+        if below_image is not None:
+            images.append((below_image, 1.0))
+        
+        # La capa activa y las superiores, de abajo hacia arriba: la primera
+        # capa de la lista es la de más arriba, como en la línea de tiempo
+        # y en las exportaciones.
+        # Se pasan copias superficiales: si se pinta sobre un frame mientras
+        # el hilo compone, Qt lo separa antes de escribir
+        images.extend(
+            (QImage(image), opacity)
+            for image, opacity in self._layer_images(self.layers[self.current_layer::-1])
+        )
         
-        # Dibujar las capas en orden (de abajo hacia arriba)
-        # No necesitamos ordenar por índice, el orden en la lista es suficiente
-        for layer in self.layers:
+        job = (self.current_frame, signature, self.size(), QColor(self.background_color), images)
+        if self.current_frame_image is None:
+            # Primer frame: no hay nada que mostrar mientras tanto
+            self._store_composite(job, CompositorThread.compose(*job[2:]))
+        else:
+            # Solo se recuerda a qué frame corresponde: retener las copias
+            # superficiales obligaría a Qt a duplicar el frame al pintarlo
+            self._pending_composite = job[:2]
+            self._compositor.request(self._composite_token, job)
+
+    def set_playback(self, playing):
+        """
+        Durante la reproducción la caché de composiciones se agranda hasta
+        la animación completa (dentro de PLAYBACK_CACHE_BYTES): desde la
+        segunda vuelta cada frame es solo un drawImage de la caché.
+        """
+        self._playing = playing
+        if playing:
+            self._release_timer.stop()
+            frame_bytes = max(1, self.width() * self.height() * 4)
+            self._frame_composite_cache_limit = max(
+                self._frame_composite_cache_default,
+                min(self._max_frame_count, PLAYBACK_CACHE_BYTES // frame_bytes)
+            )
+        else:
+            self._frame_composite_cache_limit = self._frame_composite_cache_default
+            while len(self._frame_composite_cache) > self._frame_composite_cache_limit:
+                self._frame_composite_cache.popitem(last=False)
+            self._release_timer.start()
+
+    def _on_composite_ready(self, token, image):
+        if token == self._composite_token:
+            self._store_composite(self._pending_composite, image)
+
+    def _store_composite(self, job, image):
+        frame_index, signature = job[:2]
+        self.current_frame_image = image
+        if signature is not None:
+            self._frame_composite_cache[frame_index] = (signature, image)
+            self._frame_composite_cache.move_to_end(frame_index)
+            if len(self._frame_composite_cache) > self._frame_composite_cache_limit:
+                self._frame_composite_cache.popitem(last=False)
+        self._flush_dirty()
+
+    def _mark_dirty(self, rect):
+        """Acumula la zona a repintar; las peticiones que se descartan no la pierden"""
+        if rect is None:
+            self._dirty_full = True
+            return
+        if self._dirty_full:
+            return
+        # Del lienzo al widget, con un píxel extra por el antialiasing
+        widget_rect = QTransform().translate(self.offset.x(), self.offset.y()).scale(
+            self.scale_factor, self.scale_factor
+        ).mapRect(QRectF(rect)).toAlignedRect().adjusted(-1, -1, 1, 1)
+        if self._dirty_rect is None:
+            self._dirty_rect = widget_rect
+        else:
+            self._dirty_rect = self._dirty_rect.united(widget_rect)
+
+    def _flush_dirty(self):
+        if self._dirty_full or self._dirty_rect is None:
+            self.update()
+        else:
+            self.update(self._dirty_rect)
+        self._dirty_rect = None
+        self._dirty_full = False
+
+    def _stroke_rect(self, rect):
+        """rect ampliado medio grosor de pincel por lado"""
+        margin = self.pen_size / 2.0 + 1.0
+        return QRectF(rect).adjusted(-margin, -margin, margin, margin)
+
+    def _composite_layers(self, painter, layers):
+        """Dibuja el frame actual de las capas dadas con su opacidad"""
+        for image, opacity in self._layer_images(layers):
+            painter.setOpacity(opacity)
+            painter.drawImage(0, 0, image)
+
+    def _layer_images(self, layers):
+        """(frame actual, opacidad) de las capas visibles dadas, en orden"""
+        active_layer = self.layers[self.current_layer] if self.current_layer < len(self.layers) else None
+        images = []
+        for layer in layers:
             if layer.visible and layer.frames:
-                current_frame = layer.frames.get(self.current_frame, None)
+                current_frame = layer.frame_at(self.current_frame)
                 if current_frame:
-                    painter.setOpacity(layer.opacity / 100.0)
-                    painter.drawImage(0, 0, current_frame)
+                    if layer is active_layer and self._is_previewing_selection():
+                        current_frame = self._selection_preview_frame(current_frame)
+                    if layer is active_layer and self._stroke_overlay is not None:
+                        if self.current_tool == "eraser":
+                            # La copia del frame ya tiene borrado el trazo
+                            current_frame = self._stroke_overlay
+                        else:
+                            images.append((current_frame, layer._opacity_f))
+                            current_frame = self._stroke_overlay
+                    images.append((current_frame, layer._opacity_f))
+        return images
+
+    def _is_previewing_selection(self):
+        return (self.current_tool == "selection" and
+                (self.selection_tool.moving or self.selection_tool.scaling))
+
+    def _selection_preview_frame(self, frame):
+        """Vista temporal del frame mientras se mueve o escala la selección"""
+        temp_frame = frame.copy()
+        temp_painter = QPainter(temp_frame)
+        
+        # Clear original selection area
+        temp_painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Clear)
+        if self.selection_tool.original_rect:
+            x, y, w, h = self.selection_tool.original_rect
+            temp_painter.fillRect(x, y, w, h, Qt.GlobalColor.transparent)
+        
+        # Draw current selection content
+        temp_painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_SourceOver)
+        if self.selection_tool.scaling and hasattr(self.selection_tool, 'scaled_content'):
+            content = self.selection_tool.scaled_content
+        else:
+            content = self.selection_tool.selected_content
+            
+        if content:
+            x, y, w, h = self.selection_tool.selection_rect
+            temp_painter.drawImage(x, y, content)
+        
+        temp_painter.end()
+        return temp_frame
+
+    def _get_below_composite(self):
+        """
+        Devuelve la composición de las capas bajo la capa activa.
+        La entrada cacheada se valida con la visibilidad, opacidad y
+        Layer.frame_key de cada frame, que cambia al modificar la imagen.
+        """
+        below_layers = self.layers[self.current_layer + 1:]
+        if not below_layers:
+            return None
         
+        signature = (self.size(),) + tuple(
+            (id(layer), layer.visible, layer.opacity,
+             layer.frame_key(self.current_frame))
+            for layer in below_layers
+        )
+        key = (self.current_frame, self.current_layer)
+        cached = self._below_cache.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        
+        below_image = QImage(self.size(), QImage.Format.Format_ARGB32_Premultiplied)
+        below_image.fill(Qt.GlobalColor.transparent)
+        painter = QPainter(below_image)
+        self._composite_layers(painter, reversed(below_layers))
         painter.end()
-        self.current_frame_image = temp_image
-        self.update()
+        
+        # Limitar el número de composiciones guardadas
+        self._below_cache.pop(key, None)
+        if len(self._below_cache) >= self._below_cache_limit:
+            self._below_cache.pop(next(iter(self._below_cache)))
+        self._below_cache[key] = (signature, below_image)
+        return below_image
 
     def draw_frame(self, frame_number):
-        # Crear una imagen temporal para el frame actual
-        temp_image = QImage(self.size(), QImage.Format.Format_ARGB32)
-        temp_image.fill(Qt.GlobalColor.transparent)
+        # Crear una imagen temporal opaca con el color de fondo para el frame actual
+        temp_image = QImage(self.size(), QImage.Format.Format_RGB32)
+        temp_image.fill(self.background_color)
         painter = QPainter(temp_image)
         
-        # Dibujar las capas en orden (de abajo hacia arriba)
-        # No necesitamos ordenar por índice, el orden en la lista es suficiente
-        for layer in self.layers:
-            if layer.visible and frame_number in layer.frames:
-                frame_image = layer.frames[frame_number]
-                painter.setOpacity(layer.opacity / 100.0)
+        # Dibujar las capas de abajo hacia arriba (la primera de la lista va arriba)
+        for layer in reversed(self.layers):
+            frame_image = layer.frame_at(frame_number) if layer.visible else None
+            if frame_image is not None:
+                painter.setOpacity(layer._opacity_f)
                 painter.drawImage(0, 0, frame_image)
         
         painter.end()
@@ -386,15 +1263,16 @@ class AnimationCanvas(QWidget):
         if current_layer.locked or not current_layer.frames:
             return
             
-        if self.current_frame not in current_layer.frames:
+        if self.current_frame >= len(current_layer.frames):
             current_layer.add_frame(self.current_frame)
+            self._frames_grew(len(current_layer.frames))
             
         current_frame = current_layer.frames[self.current_frame]
         painter = QPainter(current_frame)
         self._setup_painter(painter)
         painter.drawPoint(point)
         painter.end()
-        self.draw_current_frame()
+        self.draw_current_frame(self._stroke_rect(QRectF(QPointF(point), QPointF(point))))
 
     def _draw_line(self, start, end):
         if not self.layers:
@@ -409,12 +1287,18 @@ class AnimationCanvas(QWidget):
         self._setup_painter(painter)
         painter.drawLine(start, end)
         painter.end()
-        self.update()
+        self.draw_current_frame(self._stroke_rect(QRectF(QPointF(start), QPointF(end)).normalized()))
 
-    def _setup_painter(self, painter):
-        """Configure painter settings including opacity"""
+    def _setup_painter(self, painter, final=True):
+        """
+        Configure painter settings including opacity.
+        final=False es para la vista previa del trazo, que se descarta al
+        soltar el mouse: se pinta sin antialiasing porque es mucho más barato.
+        """
         # Configure anti-aliasing
         self.aa_manager.configure_painter(painter)
+        if not final:
+            painter.setRenderHint(QPainter.RenderHint.Antialiasing, False)
         
         if self.current_tool == "eraser":
             pen = QPen(Qt.GlobalColor.white)
@@ -459,19 +1343,45 @@ class AnimationCanvas(QWidget):
     def change_frame(self, frame_index):
         if frame_index >= 0 and self.layers:
             self.current_frame = frame_index
+            if not self._playing:
+                self._release_timer.start()
             self.draw_current_frame()  # Usar draw_current_frame en lugar de update
 
+    def _release_far_frames(self):
+        """Descarta los frames decodificados lejos del frame actual"""
+        if self._playing:
+            return
+        # Las celdas visibles del timeline conservan sus frames
+        visible = (self._main_window.timeline_widget._grid_window
+                   if self._main_window is not None else None)
+        for layer in self.layers:
+            layer.release_frames(self.current_frame, visible)
+
+    def _notify_frame_edited(self):
+        """Avisa al timeline que el frame actual cambió, para su miniatura"""
+        if self._main_window is not None:
+            self._main_window.timeline_widget.refresh_thumbnail(self.current_layer, self.current_frame)
+
+    def _notify_layer_restored(self):
+        """Undo/redo reemplaza todos los frames de la capa: refrescar su fila"""
+        if self._main_window is not None:
+            self._main_window.timeline_widget.update_frame_grid()
+
     def undo(self):
         if self.layers and self.current_layer < len(self.layers):
             if self.layers[self.current_layer].undo():
+                self._refresh_max_frame_count()
                 self.draw_current_frame()
+                self._notify_layer_restored()
                 return True
         return False
 
     def redo(self):
         if self.layers and self.current_layer < len(self.layers):
             if self.layers[self.current_layer].redo():
+                self._refresh_max_frame_count()
                 self.draw_current_frame()
+                self._notify_layer_restored()
                 return True
         return False
 
@@ -488,18 +1398,14 @@ class AnimationCanvas(QWidget):
             if self.current_frame > 0:
                 self.current_frame -= 1
                 self.draw_current_frame()
-                for widget in QApplication.topLevelWidgets():
-                    if isinstance(widget, QMainWindow):
-                        widget.timeline_widget.update_frame_grid()
-                        break
+                if self._main_window is not None:
+                    self._main_window.timeline_widget.refresh_current_highlight()
         elif event.key() == Qt.Key.Key_Right:
             if self.layers and self.current_frame < len(self.layers[self.current_layer].frames) - 1:
                 self.current_frame += 1
                 self.draw_current_frame()
-                for widget in QApplication.topLevelWidgets():
-                    if isinstance(widget, QMainWindow):
-                        widget.timeline_widget.update_frame_grid()
-                        break
+                if self._main_window is not None:
+                    self._main_window.timeline_widget.refresh_current_highlight()
         event.accept()
 
     def paintEvent(self, event):
@@ -510,64 +1416,13 @@ class AnimationCanvas(QWidget):
         painter.translate(self.offset)
         painter.scale(self.scale_factor, self.scale_factor)
         
-        # Draw background
-        painter.fillRect(self.rect(), self.background_color)
-        
-        # Draw onion skin frames if enabled
-        if self.onion_skin_enabled:
-            # Draw previous frames with blue tint
-            for i in range(1, self.onion_skin_frames + 1):
-                prev_frame = self.current_frame - i
-                if prev_frame >= 0:
-                    opacity = self.onion_skin_opacity * (1 - (i - 1) / self.onion_skin_frames) / 100.0
-                    painter.setOpacity(opacity)
-                    tint_color = QColor(0, 0, 255, int(255 * opacity))
-                    self._draw_onion_frame(painter, prev_frame, tint_color)
-            
-            # Draw future frames with red tint
-            for i in range(1, self.onion_skin_frames + 1):
-                next_frame = self.current_frame + i
-                if next_frame < max(len(layer.frames) for layer in self.layers if layer.frames):
-                    opacity = self.onion_skin_opacity * (1 - (i - 1) / self.onion_skin_frames) / 100.0
-                    painter.setOpacity(opacity)
-                    tint_color = QColor(255, 0, 0, int(255 * opacity))
-                    self._draw_onion_frame(painter, next_frame, tint_color)
-        
-        # Draw current frame layers
-        painter.setOpacity(1.0)
-        for layer in reversed(self.layers):
-            if layer.visible and self.current_frame in layer.frames:
-                current_frame = layer.frames[self.current_frame]
-                painter.setOpacity(layer.opacity / 100.0)
-                
-                if (self.current_tool == "selection" and 
-                    layer == self.layers[self.current_layer] and 
-                    (self.selection_tool.moving or self.selection_tool.scaling)):
-                    # Draw temporary view for moving/scaling
-                    temp_frame = current_frame.copy()
-                    temp_painter = QPainter(temp_frame)
-                    
-                    # Clear original selection area
-                    temp_painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Clear)
-                    if self.selection_tool.original_rect:
-                        x, y, w, h = self.selection_tool.original_rect
-                        temp_painter.fillRect(x, y, w, h, Qt.GlobalColor.transparent)
-                    
-                    # Draw current selection content
-                    temp_painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_SourceOver)
-                    if self.selection_tool.scaling and hasattr(self.selection_tool, 'scaled_content'):
-                        content = self.selection_tool.scaled_content
-                    else:
-                        content = self.selection_tool.selected_content
-                        
-                    if content:
-                        x, y, w, h = self.selection_tool.selection_rect
-                        temp_painter.drawImage(x, y, content)
-                    
-                    temp_painter.end()
-                    painter.drawImage(0, 0, temp_frame)
-                else:
-                    painter.drawImage(0, 0, current_frame)
+        # Un repintado externo (grab, render) no espera al timer
+        if self._composite_timer.isActive():
+            self._composite_timer.stop()
+            self._compose_current_frame()
+        
+        # draw_current_frame ya compuso fondo, papel cebolla y capas
+        painter.drawImage(0, 0, self.current_frame_image)
         
         # Draw selection tools if active
         if self.current_tool == "selection" and self.selection_tool.selection_rect:
@@ -633,42 +1488,135 @@ class AnimationCanvas(QWidget):
         pen.setCapStyle(Qt.PenCapStyle.RoundCap)
         pen.setJoinStyle(Qt.PenJoinStyle.RoundJoin)
         return pen
+    def _get_onion_overlay(self):
+        """
+        Devuelve los frames anteriores (azul) y siguientes (rojo) ya teñidos
+        y compuestos en una sola imagen. Como la composición del fondo, la
+        entrada se valida con Layer.frame_key de los frames involucrados, así
+        cualquier edición, relleno o movimiento la invalida.
+        """
+        max_frames = self._max_frame_count
+        if not max_frames:
+            return None
+        
+        # (frame, tinte, opacidad) en el mismo orden en que se dibujaban
+        onion_frames = []
+        for i in range(1, self.onion_skin_frames + 1):
+            prev_frame = self.current_frame - i
+            if prev_frame >= 0:
+                opacity = self.onion_skin_opacity * (1 - (i - 1) / self.onion_skin_frames) / 100.0
+                onion_frames.append((prev_frame, QColor(0, 0, 255, int(255 * opacity)), opacity))
+        for i in range(1, self.onion_skin_frames + 1):
+            next_frame = self.current_frame + i
+            if next_frame < max_frames:
+                opacity = self.onion_skin_opacity * (1 - (i - 1) / self.onion_skin_frames) / 100.0
+                onion_frames.append((next_frame, QColor(255, 0, 0, int(255 * opacity)), opacity))
+        if not onion_frames:
+            return None
+        
+        signature = (self.size(),) + tuple(
+            (id(layer), layer.visible) + tuple(
+                layer.frame_key(frame_index)
+                for frame_index, _, _ in onion_frames
+            )
+            for layer in self.layers
+        )
+        key = (self.current_frame, self.onion_skin_frames, self.onion_skin_opacity)
+        cached = self._onion_cache.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        
+        onion_image = QImage(self.size(), QImage.Format.Format_ARGB32_Premultiplied)
+        onion_image.fill(Qt.GlobalColor.transparent)
+        painter = QPainter(onion_image)
+        for frame_index, tint_color, opacity in onion_frames:
+            painter.setOpacity(opacity)
+            self._draw_onion_frame(painter, frame_index, tint_color)
+        painter.end()
+        
+        # Limitar el número de composiciones guardadas
+        self._onion_cache.pop(key, None)
+        if len(self._onion_cache) >= self._onion_cache_limit:
+            self._onion_cache.pop(next(iter(self._onion_cache)))
+        self._onion_cache[key] = (signature, onion_image)
+        return onion_image
+
     def _draw_onion_frame(self, painter, frame_index, tint_color):
         for layer in reversed(self.layers):
-            if layer.visible and frame_index in layer.frames:
-                frame = layer.frames[frame_index]
-                
-                # Create tinted copy of the frame
-                tinted_frame = QImage(frame.size(), QImage.Format.Format_ARGB32_Premultiplied)
-                tinted_frame.fill(Qt.GlobalColor.transparent)
-                
-                frame_painter = QPainter(tinted_frame)
-                frame_painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_SourceOver)
-                frame_painter.drawImage(0, 0, frame)
-                
-                # Apply tint color
-                frame_painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_SourceAtop)
-                frame_painter.fillRect(tinted_frame.rect(), tint_color)
-                frame_painter.end()
+            frame_key = layer.frame_key(frame_index) if layer.visible else None
+            if frame_key is not None:
+                # Un frame modificado cambia de clave, así que sus copias
+                # teñidas viejas nunca vuelven a usarse y salen por LRU
+                key = (frame_key, tint_color.rgba())
+                tinted_frame = self._onion_tint_cache.get(key)
+                if tinted_frame is not None:
+                    self._onion_tint_cache.move_to_end(key)
+                else:
+                    tinted_frame = self._tint_frame(layer.frame_at(frame_index), tint_color)
+                    if len(self._onion_tint_cache) >= self._onion_tint_cache_limit:
+                        self._onion_tint_cache.popitem(last=False)
+                    self._onion_tint_cache[key] = tinted_frame
                 
                 # Draw tinted frame
                 painter.drawImage(0, 0, tinted_frame)
+
+    @staticmethod
+    def _pixel_view(image, writable=True):
+        """
+        Vista numpy (alto, ancho, 4) sobre los píxeles de un QImage de 32
+        bits, en orden B, G, R, A. Escribir en ella modifica la imagen
+        directamente; con writable=False es de solo lectura y usa
+        constBits(), así Qt no separa una imagen compartida.
+        """
+        ptr = image.bits() if writable else image.constBits()
+        ptr.setsize(image.sizeInBytes())
+        return np.frombuffer(ptr, np.uint8).reshape(
+            image.height(), image.bytesPerLine() // 4, 4
+        )[:, :image.width()]
+
+    @classmethod
+    def _tint_frame(cls, frame, tint_color):
+        """
+        Devuelve una copia teñida del frame en un solo paso vectorizado.
+        Equivale a dibujar el frame y aplicar fillRect(tint) en modo
+        SourceAtop: rgb = src * (1 - a) + tint * a * src_alpha, alfa intacto.
+        """
+        if frame.format() != QImage.Format.Format_ARGB32_Premultiplied:
+            frame = frame.convertToFormat(QImage.Format.Format_ARGB32_Premultiplied)
+        width, height = frame.width(), frame.height()
+        
+        src = cls._pixel_view(frame, writable=False)
+        tinted_frame = QImage(width, height, QImage.Format.Format_ARGB32_Premultiplied)
+        dst = cls._pixel_view(tinted_frame)
+        
+        tint_alpha = tint_color.alpha()
+        tint_bgr = np.array([tint_color.blue(), tint_color.green(), tint_color.red()],
+                            np.uint32) * tint_alpha
+        
+        # Acumular en 32 bits y escalar por 255*255 al final
+        rgb = src[..., :3].astype(np.uint32)
+        np.multiply(rgb, (255 - tint_alpha) * 255, out=rgb)
+        rgb += src[..., 3:4].astype(np.uint32) * tint_bgr
+        rgb //= 255 * 255
+        dst[..., :3] = rgb
+        dst[..., 3] = src[..., 3]
+        return tinted_frame
     
     
     def toggle_onion_skin(self):
         """Toggle onion skin visibility"""
         self.onion_skin_enabled = not self.onion_skin_enabled
-        self.update()
+        self.draw_current_frame()
 
     def set_onion_skin_frames(self, frames):
         """Set number of onion skin frames to show"""
         self.onion_skin_frames = max(1, min(5, frames))  # Limit between 1-5 frames
-        self.update()
+        self.draw_current_frame()
 
     def set_onion_skin_opacity(self, opacity):
         """Set opacity percentage for onion skin"""
         self.onion_skin_opacity = max(0, min(100, opacity))  # Limit between 0-100%
-        self.update()
+        self.draw_current_frame()
 
     def mousePressEvent(self, event):
         if event.button() == Qt.MouseButton.LeftButton:
@@ -716,10 +1664,21 @@ class AnimationCanvas(QWidget):
             else:
                 # Handle drawing tools
                 self.drawing = True
-                self.current_points = [transformed_pos]
+                self._point_count = 0
+                self._append_point(transformed_pos)
                 self.last_point = transformed_pos
                 if self.current_tool != "bucket":
+                    if self.current_tool != "eraser":
+                        self._stroke_overlay = QImage(self.size(), QImage.Format.Format_ARGB32_Premultiplied)
+                        self._stroke_overlay.fill(Qt.GlobalColor.transparent)
+                    self._committed_path = QPainterPath()
+                    self._committed_index = 0
+                    self._stroke_bounds = QRectF()
                     self._draw_point(transformed_pos)
+                    if self.current_tool == "eraser":
+                        # Copia de trabajo del frame, ya con el primer punto borrado
+                        frame = self.layers[self.current_layer].frame_at(self.current_frame) if self.layers else None
+                        self._stroke_overlay = frame.copy() if frame is not None else None
 
     def mouseMoveEvent(self, event):
         transformed_pos = (event.pos() - self.offset) / self.scale_factor
@@ -739,69 +1698,127 @@ class AnimationCanvas(QWidget):
                 else:
                     # Actualizar el rectángulo de selección si estamos creando uno nuevo
                     self.selection_tool.update_selection(transformed_point)
-                self.update()
+                if self._is_previewing_selection():
+                    self.draw_current_frame()
+                else:
+                    self.update()
         else:
             if self.drawing and self.last_point:
-                self.current_points.append(transformed_pos)
-                current_layer = self.layers[self.current_layer]
-                if self.current_frame not in current_layer.frames:
-                    current_layer.add_frame(self.current_frame)
-                current_frame = current_layer.frames[self.current_frame]
-                
-                temp_image = current_frame.copy()
-                painter = QPainter(temp_image)
-                self._setup_painter(painter)
-                
-                if len(self.current_points) > 2:
-                    smooth_path = self.get_smooth_path(self.current_points)
-                    painter.drawPath(smooth_path)
-                
-                painter.end()
-                current_layer.frames[self.current_frame] = temp_image
-                self.draw_current_frame()
+                self._append_point(transformed_pos)
                 self.last_point = transformed_pos
+                if self._point_count - self._committed_index >= 4:
+                    self._extend_committed_path()
+                # Agrupar las muestras: el trazo se pinta al vencer el timer
+                if not self._stroke_timer.isActive():
+                    self._stroke_timer.start()
+
+    def _append_point(self, pos):
+        """Agrega una muestra al trazo, duplicando el buffer cuando se llena"""
+        n = self._point_count
+        if n == len(self.current_points):
+            grown = np.empty((2 * n, 2), np.float64)
+            grown[:n] = self.current_points
+            self.current_points = grown
+        self.current_points[n] = (pos.x(), pos.y())
+        self._point_count = n + 1
+
+    def _flush_stroke_preview(self):
+        """Pinta de una vez todas las muestras acumuladas desde el último fotograma"""
+        if not self.drawing or self._stroke_overlay is None:
+            return
+        if self._committed_path.isEmpty():
+            return
+        
+        # Solo los segmentos nuevos; el siguiente tramo arranca donde termina este
+        # (la goma borra directamente sobre su copia del frame)
+        painter = QPainter(self._stroke_overlay)
+        self._setup_painter(painter, final=False)
+        painter.drawPath(self._committed_path)
+        painter.end()
+        
+        dirty_rect = self._stroke_rect(self._committed_path.controlPointRect())
+        self._stroke_bounds = self._stroke_bounds.united(dirty_rect)
+        end_point = self._committed_path.currentPosition()
+        self._committed_path = QPainterPath()
+        self._committed_path.moveTo(end_point)
+        self.draw_current_frame(dirty_rect)
+
+    def _extend_committed_path(self):
+        """
+        Agrega al trazo los segmentos que ya tienen sus cuatro puntos de
+        control, como curvas cubicTo en forma cerrada. Es la misma mezcla
+        de Catmull-Rom y B-spline que smooth_path, pero cada segmento se
+        calcula una sola vez en lugar de reajustar todo el trazo.
+        """
+        n = self._point_count
+        start = self._committed_index
+        tension = self.smoothing_factor / 100.0
+        path = self._committed_path
+        
+        # Floats de Python: más rápidos que escalares de numpy en este bucle
+        first = max(start - 1, 0)
+        points = self.current_points[first:n].tolist()
+        for i in range(start, n - 2):
+            x1, y1 = points[i - first]
+            x2, y2 = points[i + 1 - first]
+            x3, y3 = points[i + 2 - first]
+            if i > 0:
+                x0, y0 = points[i - 1 - first]
+            else:
+                # Punto fantasma reflejado: la curva empieza en el primer punto
+                x0, y0 = 2.0 * x1 - x2, 2.0 * y1 - y2
+            
+            # Puntos Bézier de Catmull-Rom (cr) y de la B-spline (bs)
+            cr1x, cr1y = x1 + (x2 - x0) / 6.0, y1 + (y2 - y0) / 6.0
+            cr2x, cr2y = x2 - (x3 - x1) / 6.0, y2 - (y3 - y1) / 6.0
+            bs0x, bs0y = (x0 + 4.0 * x1 + x2) / 6.0, (y0 + 4.0 * y1 + y2) / 6.0
+            bs1x, bs1y = (2.0 * x1 + x2) / 3.0, (2.0 * y1 + y2) / 3.0
+            bs2x, bs2y = (x1 + 2.0 * x2) / 3.0, (y1 + 2.0 * y2) / 3.0
+            bs3x, bs3y = (x1 + 4.0 * x2 + x3) / 6.0, (y1 + 4.0 * y2 + y3) / 6.0
+            
+            if path.isEmpty():
+                path.moveTo(x1 + tension * (bs0x - x1), y1 + tension * (bs0y - y1))
+            path.cubicTo(
+                cr1x + tension * (bs1x - cr1x), cr1y + tension * (bs1y - cr1y),
+                cr2x + tension * (bs2x - cr2x), cr2y + tension * (bs2y - cr2y),
+                x2 + tension * (bs3x - x2), y2 + tension * (bs3y - y2)
+            )
+        
+        self._committed_index = max(start, n - 2)
 
     def apply_selection_tool(self):
         if self.current_layer < len(self.layers):
             current_layer = self.layers[self.current_layer]
-            if self.current_frame in current_layer.frames:
+            if self.current_frame < len(current_layer.frames):
                 frame = current_layer.frames[self.current_frame]
                 if self.selection_tool.selection_rect:
                     x, y, w, h = self.selection_tool.selection_rect
-                    selected_area = QImage(w, h, QImage.Format.Format_ARGB32_Premultiplied)
-                    selected_area.fill(Qt.GlobalColor.transparent)
-                    
-                    painter = QPainter(selected_area)
-                    painter.drawImage(0, 0, frame, x, y, w, h)
-                    painter.end()
-                    
-                    self.selection_tool.selected_content = selected_area
+                    # copy() recorta con una copia por línea, sin QPainter;
+                    # las zonas fuera del frame quedan transparentes
+                    self.selection_tool.selected_content = frame.copy(QRect(x, y, w, h))
                     current_layer._save_state()
     def move_selected_content(self):
         if self.current_layer < len(self.layers):
             current_layer = self.layers[self.current_layer]
-            if self.current_frame in current_layer.frames and self.selection_tool.selected_content:
-                # Crear un nuevo frame limpio
+            if self.current_frame < len(current_layer.frames) and self.selection_tool.selected_content:
+                # Primero copiamos todo el contenido original (memcpy)
                 frame = current_layer.frames[self.current_frame]
-                new_frame = QImage(frame.size(), QImage.Format.Format_ARGB32_Premultiplied)
-                new_frame.fill(Qt.GlobalColor.transparent)
-                
-                painter = QPainter(new_frame)
-                
-                # Primero dibujamos todo el contenido original
-                painter.drawImage(0, 0, frame)
+                if frame.format() == QImage.Format.Format_ARGB32_Premultiplied:
+                    new_frame = frame.copy()
+                else:
+                    new_frame = frame.convertToFormat(QImage.Format.Format_ARGB32_Premultiplied)
                 
-                # Limpiamos el área original de la selección
-                painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Clear)
+                # Limpiamos el área original de la selección: transparente
+                # premultiplicado es todo ceros
                 if self.selection_tool.original_rect:
                     x, y, w, h = self.selection_tool.original_rect
-                    painter.fillRect(x, y, w, h, Qt.GlobalColor.transparent)
+                    pixels = self._pixel_view(new_frame)
+                    pixels[max(y, 0):max(y + h, 0), max(x, 0):max(x + w, 0)] = 0
                 
                 # Dibujamos el contenido seleccionado en la nueva posición
-                painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_SourceOver)
+                painter = QPainter(new_frame)
                 x, y, w, h = self.selection_tool.selection_rect
                 painter.drawImage(x, y, self.selection_tool.selected_content)
-                
                 painter.end()
                 
                 # Actualizamos el frame y guardamos el estado
@@ -826,83 +1843,98 @@ class AnimationCanvas(QWidget):
                     self.move_selected_content()
                 else:
                     self.apply_selection_tool()
-                self.update()
+                self.draw_current_frame()
+                self._notify_frame_edited()
             elif self.drawing:
                 self.drawing = False
-                if len(self.current_points) > 1:
+                # El trazo final reemplaza cualquier vista previa pendiente
+                self._stroke_timer.stop()
+                self._stroke_overlay = None
+                dirty_rect = self._stroke_bounds
+                if self._point_count > 1:
                     current_layer = self.layers[self.current_layer]
-                    if self.current_frame in current_layer.frames:
+                    if self.current_frame < len(current_layer.frames):
                         current_frame = current_layer.frames[self.current_frame]
                         
                         # Create final smooth path
-                        smooth_path = self.get_smooth_path(self.current_points)
+                        smooth_path = self.get_smooth_path(self.current_points[:self._point_count])
                         
                         # Draw final path
                         painter = QPainter(current_frame)
-                        self._setup_painter(painter)
+                        self._setup_painter(painter, final=True)
                         painter.drawPath(smooth_path)
                         painter.end()
+                        dirty_rect = dirty_rect.united(self._stroke_rect(smooth_path.controlPointRect()))
                         
                         # Save state for undo/redo
                         current_layer._save_state()
-                        self.draw_current_frame()
                 
-                self.current_points = []
+                self._point_count = 0
+                self._stroke_bounds = QRectF()
+                self.draw_current_frame(dirty_rect if not dirty_rect.isEmpty() else None)
+                self._notify_frame_edited()
                 self.last_point = None
 
     def get_smooth_path(self, points):
         """
-        Creates a smooth path from a list of points using spline interpolation.
-        Enhanced tablet support while maintaining original mouse behavior.
+        Creates a smooth path from an (N, 2) array of points using spline
+        interpolation. Enhanced tablet support while maintaining original
+        mouse behavior.
         """
         if len(points) < 3:
-            path = QPainterPath()
-            if points:
-                path.moveTo(QPointF(points[0]))
-                for point in points[1:]:
-                    path.lineTo(QPointF(point))
-            return path
+            if not len(points):
+                return QPainterPath()
+            return self._polyline_path(points[:, 0], points[:, 1])
+
+        # Trazos más chicos que el pincel o casi rectos: el suavizado no
+        # cambiaría nada visible, se dibujan tal cual
+        if self._is_plain_stroke(points):
+            return self._polyline_path(points[:, 0], points[:, 1])
 
         # Detectar si es entrada de tableta
-        is_tablet = len(points) > 50
+        is_tablet = len(points) > TABLET_MIN_POINTS
 
         if is_tablet:
             # Para tableta: ajustar puntos manteniendo la forma
-            normalized_points = []
-            prev_point = points[0]
-            normalized_points.append(prev_point)
+            coords = points.tolist()
+            prev_x, prev_y = coords[0]
+            normalized_points = [(prev_x, prev_y)]
             
             # Distancia más pequeña para mejor precisión en curvas cerradas
             target_distance = 3.0
             
-            for point in points[1:]:
-                distance = ((point.x() - prev_point.x())**2 + 
-                        (point.y() - prev_point.y())**2)**0.5
+            for px, py in coords[1:]:
+                distance = ((px - prev_x)**2 + (py - prev_y)**2)**0.5
                 if distance >= target_distance:
                     # Interpolar punto adicional en curvas cerradas
                     if distance > target_distance * 2:
-                        mid_x = (prev_point.x() + point.x()) / 2
-                        mid_y = (prev_point.y() + point.y()) / 2
-                        normalized_points.append(QPointF(mid_x, mid_y))
-                    normalized_points.append(point)
-                    prev_point = point
+                        normalized_points.append(((prev_x + px) / 2, (prev_y + py) / 2))
+                    normalized_points.append((px, py))
+                    prev_x, prev_y = px, py
             
-            points = normalized_points
+            points = np.array(normalized_points, dtype=np.float64).reshape(-1, 2)
         else:
             # Mantener comportamiento original del mouse
             if len(points) > 50:
                 points = points[::2]
 
-        # Convert points to numpy arrays
-        x = np.array([p.x() for p in points])
-        y = np.array([p.y() for p in points])
+        x = points[:, 0]
+        y = points[:, 1]
 
         if np.std(x) == 0 and np.std(y) == 0:
             path = QPainterPath()
-            path.moveTo(QPointF(points[0]))
+            path.moveTo(*points[0])
             return path
 
         try:
+            if len(points) < SMOOTH_KERNEL_MAX_POINTS:
+                # Trazos cortos: evitar el costo fijo de splprep/splev
+                smooth_x, smooth_y = smooth_path(
+                    np.ascontiguousarray(x), np.ascontiguousarray(y),
+                    self.smoothing_factor / 100.0, 2
+                )
+                return self._polyline_path(smooth_x, smooth_y)
+            
             if is_tablet:
                 # Ajuste fino para tableta
                 base_smoothing = self.smoothing_factor / 100.0
@@ -924,102 +1956,114 @@ class AnimationCanvas(QWidget):
             smooth_points = splev(u_new, tck)
 
             # Crear path
-            path = QPainterPath()
-            path.moveTo(QPointF(smooth_points[0][0], smooth_points[1][0]))
-            for i in range(1, len(smooth_points[0])):
-                path.lineTo(QPointF(smooth_points[0][i], smooth_points[1][i]))
-            
-            return path
+            return self._polyline_path(smooth_points[0], smooth_points[1])
         except:
             # Fallback path
-            path = QPainterPath()
-            path.moveTo(QPointF(points[0]))
-            for point in points[1:]:
-                path.lineTo(QPointF(point))
-            return path
+            return self._polyline_path(points[:, 0], points[:, 1])
+
+    def _is_plain_stroke(self, points):
+        """
+        True si el trazo cabe dentro del ancho del pincel o si todos sus
+        puntos están a menos de STRAIGHT_STROKE_TOLERANCE de su recta de
+        ajuste (eje principal de los puntos).
+        """
+        x = points[:, 0]
+        y = points[:, 1]
+        if max(np.ptp(x), np.ptp(y)) < self.pen_size:
+            return True
+        
+        dx = x - x.mean()
+        dy = y - y.mean()
+        sxx = np.dot(dx, dx)
+        syy = np.dot(dy, dy)
+        sxy = np.dot(dx, dy)
+        angle = 0.5 * math.atan2(2.0 * sxy, sxx - syy)
+        residual = np.abs(dy * math.cos(angle) - dx * math.sin(angle))
+        return residual.max() < STRAIGHT_STROKE_TOLERANCE
+
+    @staticmethod
+    def _polyline_path(xs, ys):
+        """
+        Path de segmentos rectos que une los puntos (xs, ys). Las
+        coordenadas se copian directo al buffer del QPolygonF (pares de
+        doubles, igual que QPointF) y el path se arma con un solo addPolygon.
+        """
+        n = len(xs)
+        polygon = QPolygonF()
+        polygon.resize(n)
+        buffer = polygon.data()
+        buffer.setsize(n * 2 * 8)
+        coords = np.frombuffer(buffer, np.float64).reshape(n, 2)
+        coords[:, 0] = xs
+        coords[:, 1] = ys
+        path = QPainterPath()
+        path.addPolygon(polygon)
+        return path
 
     def _flood_fill(self, start_pos, target_color, replacement_color):
         """
         Enhanced flood fill algorithm that prevents gaps between fill and strokes.
         Uses 8-directional filling and color tolerance for smoother results.
+        Works on the raw pixel buffer: with numba the compiled scanline
+        kernel visits only the filled region, otherwise the region is found
+        with NumPy and scipy.ndimage.label.
         """
         if not self.layers:
             return
                 
         current_layer = self.layers[self.current_layer]
-        if current_layer.locked or self.current_frame not in current_layer.frames:
+        if current_layer.locked or self.current_frame >= len(current_layer.frames):
             return
                 
         current_frame = current_layer.frames[self.current_frame]
         width = current_frame.width()
         height = current_frame.height()
+        x, y = start_pos.x(), start_pos.y()
+        if not (0 <= x < width and 0 <= y < height):
+            return
         
-        # Create a copy of the frame to work on
-        working_frame = current_frame.copy()
-        
-        # Get start pixel color
-        start_color = working_frame.pixelColor(start_pos)
-        if start_color == replacement_color:
+        # Si el inicio ya tiene el color de relleno no hay nada que hacer:
+        # se comprueba antes de convertir el frame completo
+        if current_frame.pixelColor(x, y) == replacement_color:
             return
         
+        # Trabajar sobre una copia sin premultiplicar para comparar colores reales
+        working_frame = current_frame.convertToFormat(QImage.Format.Format_ARGB32)
+        
         # Color tolerance for matching (0-255)
         tolerance = 150
         
-        def colors_match(color1, color2):
-            return (abs(color1.red() - color2.red()) <= tolerance and
-                    abs(color1.green() - color2.green()) <= tolerance and
-                    abs(color1.blue() - color2.blue()) <= tolerance and
-                    abs(color1.alpha() - color2.alpha()) <= tolerance)
+        # Vista NumPy del buffer, en orden B, G, R, A
+        pixels = self._pixel_view(working_frame)
         
-        # Create painter for drawing
-        painter = QPainter(working_frame)
-        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-        painter.setPen(QPen(replacement_color))
-        
-        # Use set for visited pixels to prevent duplicates
-        visited = set()
-        # Use list for stack (more efficient than recursion)
-        stack = [(start_pos.x(), start_pos.y())]
-        
-        # 8-directional fill (including diagonals)
-        directions = [
-            (-1, -1), (0, -1), (1, -1),
-            (-1,  0),          (1,  0),
-            (-1,  1), (0,  1), (1,  1)
-        ]
+        # Color de inicio leído directamente del buffer
+        start_bgra = pixels[y, x].astype(np.int16)
+        fill_bgra = np.array([replacement_color.blue(), replacement_color.green(),
+                              replacement_color.red(), replacement_color.alpha()], np.uint8)
         
-        while stack:
-            x, y = stack.pop()
+        if HAVE_NUMBA:
+            left, top, right, bottom = flood_fill_scanline(
+                pixels, x, y, start_bgra, fill_bgra, tolerance
+            )
+        else:
+            mask = (np.abs(pixels.astype(np.int16) - start_bgra) <= tolerance).all(axis=-1)
             
-            if (x, y) in visited:
-                continue
-                
-            current_color = working_frame.pixelColor(x, y)
-            if not colors_match(current_color, start_color):
-                continue
-                
-            # Draw the current pixel
-            painter.drawPoint(x, y)
-            visited.add((x, y))
-            
-            # Check all 8 directions
-            for dx, dy in directions:
-                new_x = x + dx
-                new_y = y + dy
-                
-                if (0 <= new_x < width and 
-                    0 <= new_y < height and 
-                    (new_x, new_y) not in visited):
-                    stack.append((new_x, new_y))
-        
-        painter.end()
+            # Componente conexa (8 direcciones, incluyendo diagonales) que contiene el inicio
+            labels, _ = ndimage.label(mask, structure=np.ones((3, 3), dtype=bool))
+            region = labels == labels[y, x]
+            pixels[region] = fill_bgra
+            rows, cols = np.flatnonzero(region.any(axis=1)), np.flatnonzero(region.any(axis=0))
+            top, bottom, left, right = rows[0], rows[-1], cols[0], cols[-1]
         
         # Update the frame in the current layer
-        current_layer.frames[self.current_frame] = working_frame
+        current_layer.frames[self.current_frame] = working_frame.convertToFormat(
+            QImage.Format.Format_ARGB32_Premultiplied
+        )
         current_layer._save_state()
         
-        # Update the display
-        self.draw_current_frame()
+        # Update the display: solo la zona rellenada
+        self.draw_current_frame(QRectF(left, top, right - left + 1, bottom - top + 1))
+        self._notify_frame_edited()
     
     def get_pixel_color(self, pos):
         """Helper method to get color at position"""
@@ -1027,7 +2071,7 @@ class AnimationCanvas(QWidget):
             return QColor(Qt.GlobalColor.transparent)
             
         current_layer = self.layers[self.current_layer]
-        if self.current_frame not in current_layer.frames:
+        if self.current_frame >= len(current_layer.frames):
             return QColor(Qt.GlobalColor.transparent)
             
         frame = current_layer.frames[self.current_frame]
@@ -1036,16 +2080,12 @@ class AnimationCanvas(QWidget):
     def resize_canvas(self, new_width, new_height):
         """Resize the canvas and all layers to the new dimensions."""
         for layer in self.layers:
-            resized_frames = {}
-            for index, frame in layer.frames.items():
-                resized_frame = QImage(new_width, new_height, QImage.Format.Format_ARGB32_Premultiplied)
-                resized_frame.fill(Qt.GlobalColor.transparent)
-                
-                painter = QPainter(resized_frame)
-                painter.drawImage(0, 0, frame)
-                painter.end()
-                
-                resized_frames[index] = resized_frame
+            resized_frames = []
+            for frame in layer.frames:
+                # copy() recorta o amplía con una copia directa del buffer;
+                # lo que queda fuera del frame original se rellena con 0
+                # (transparente)
+                resized_frames.append(frame.copy(0, 0, new_width, new_height))
             
             layer.frames = resized_frames
             layer.width = new_width
@@ -1064,42 +2104,133 @@ class AnimationCanvas(QWidget):
         
         # For each layer, duplicate the current frame
         for layer in self.layers:
-            if current_frame in layer.frames:
-                # Create a copy of the current frame
-                new_frame = layer.frames[current_frame].copy()
-                
-                # Shift all subsequent frames forward
-                new_frames = {}
-                for frame_idx in sorted(layer.frames.keys()):
-                    if frame_idx <= current_frame:
-                        new_frames[frame_idx] = layer.frames[frame_idx]
-                    else:
-                        new_frames[frame_idx + 1] = layer.frames[frame_idx]
-                        
-                # Insert the duplicated frame
-                new_frames[current_frame + 1] = new_frame
-                layer.frames = new_frames
+            if current_frame < len(layer.frames):
+                # Insert a copy of the current frame right after it
+                layer.frames.insert(current_frame + 1, layer.frames[current_frame].copy())
                 
                 # Save state for undo/redo
                 layer._save_state()
+        self._refresh_max_frame_count()
         
         # Move to the duplicated frame
         self.current_frame = current_frame + 1
         self.draw_current_frame()
         return True
 
+class ThumbnailSignals(QObject):
+    """QRunnable no es un QObject: las tareas emiten a través de este puente"""
+    ready = pyqtSignal(object, QImage)
+
+
+class ThumbnailTask(QRunnable):
+    """
+    Genera la miniatura de un frame en el pool de hilos. Trabaja sobre
+    QImage (QPixmap solo puede crearse en el hilo de la interfaz) y
+    devuelve la miniatura junto con la clave del frame (Layer.frame_key).
+    frame puede ser un QImage o el PNG de un frame todavía sin decodificar.
+    """
+    def __init__(self, key, frame, signals):
+        super().__init__()
+        self.key = key
+        self.frame = frame
+        self.signals = signals
+
+    def run(self):
+        # Fondo blanco para distinguir un frame vacío de una celda sin frame
+        thumb = QImage(THUMBNAIL_SIZE, THUMBNAIL_SIZE, QImage.Format.Format_ARGB32_Premultiplied)
+        thumb.fill(Qt.GlobalColor.white)
+        frame = self.frame
+        if isinstance(frame, bytes):
+            # Se decodifica aquí y se descarta: la capa sigue con su PNG
+            frame = QImage.fromData(frame, "PNG")
+        scaled = frame.scaled(
+            THUMBNAIL_SIZE, THUMBNAIL_SIZE,
+            Qt.AspectRatioMode.KeepAspectRatio,
+            Qt.TransformationMode.SmoothTransformation
+        )
+        painter = QPainter(thumb)
+        painter.drawImage((THUMBNAIL_SIZE - scaled.width()) // 2,
+                          (THUMBNAIL_SIZE - scaled.height()) // 2, scaled)
+        painter.end()
+        try:
+            self.signals.ready.emit(self.key, thumb)
+        except RuntimeError:
+            # La interfaz se cerró mientras la tarea seguía en el pool
+            pass
+
+
 class TimelineWidget(QWidget):
+    # Máximo de columnas representable en los ids del grupo de botones
+    FRAME_ID_STRIDE = 10000
+    # Paso (botón de 30 px + separación) y margen de las celdas del grid
+    FRAME_CELL = 32
+    FRAME_GRID_MARGIN = 4
+
     def __init__(self, canvas, parent=None):
         super().__init__(parent)
         self.canvas = canvas
         self.layer_height = 100
         self.playing = False
         self.play_timer = QTimer()
+        self.play_timer.setTimerType(Qt.TimerType.PreciseTimer)
         self.play_timer.timeout.connect(self.next_frame)
         self.play_timer.setInterval(1000 // 24)  # 24 FPS por defecto
+        # Reloj de la reproducción: si un cuadro llega tarde se saltan frames
+        # en lugar de acumular retraso
+        self._play_elapsed = QElapsedTimer()
+        self._interval_ms = 1000 / 24
+        self._next_due_ms = 0.0
         self.copied_layer = None
         self.copied_frame = None
         self.speed_slider = None  # Se inicializará en init_ui()
+        # Botones del grid de frames reutilizados entre actualizaciones,
+        # indexados por (fila, columna); _grid_row_state guarda por fila
+        # (cantidad de frames, visible) tal como se pintó por última vez.
+        # Solo existen botones para las columnas visibles (_grid_window);
+        # los que salen de la vista esperan en _spare_buttons para reusarse
+        self._frame_buttons = {}
+        self._spare_buttons = []
+        # Un solo grupo despacha los clics de todo el grid; el id de cada
+        # botón codifica su celda como fila * FRAME_ID_STRIDE + columna
+        self._frame_group = QButtonGroup(self)
+        self._frame_group.idClicked.connect(self._on_frame_id_clicked)
+        self._grid_row_state = []
+        self._grid_window = (0, 0)
+        self._last_highlight = None
+        # Filas de la lista de capas reutilizadas entre actualizaciones:
+        # (item, botón de visibilidad, etiqueta del nombre) por capa
+        self._layer_items = []
+        # Las miniaturas viven en QPixmapCache (LRU por bytes) indexadas por
+        # Layer.frame_key: un frame editado cambia de clave y su miniatura
+        # se regenera
+        QPixmapCache.setCacheLimit(max(QPixmapCache.cacheLimit(), THUMBNAIL_CACHE_KB))
+        # clave -> celdas que esperan esa miniatura
+        self._thumb_pending = {}
+        # clave de la miniatura que muestra cada celda
+        self._cell_thumbs = {}
+        self._thumb_pool = QThreadPool.globalInstance()
+        # Sin padre: las tareas en curso lo mantienen vivo
+        self._thumb_signals = ThumbnailSignals()
+        self._thumb_signals.ready.connect(self._on_thumbnail_ready)
+        # Refresco diferido de lista, grid y canvas: las operaciones seguidas
+        # (repetición de teclas, varias ediciones) se resuelven en uno solo
+        self._refresh_timer = coalescing_timer(self, FRAME_INTERVAL_MS, self._do_refresh)
+        # Aviso flotante para confirmar ediciones sin abrir un diálogo modal
+        self._toast = QLabel(self)
+        self._toast.setStyleSheet(
+            "background-color: rgba(0, 0, 0, 180); color: white;"
+            " padding: 4px 8px; border-radius: 4px;"
+        )
+        self._toast.hide()
+        self._toast_timer = coalescing_timer(self, 1500, self._toast.hide)
+        # Menú contextual de los frames, compartido por todas las celdas:
+        # show_frame_context_menu solo anota la celda antes de mostrarlo
+        self._menu_cell = (0, 0)
+        self._frame_menu = QMenu(self)
+        self._copy_frame_action = self._frame_menu.addAction("Copiar fotograma")
+        self._copy_frame_action.triggered.connect(self._copy_menu_frame)
+        self._paste_frame_action = self._frame_menu.addAction("Pegar fotograma")
+        self._paste_frame_action.triggered.connect(self._paste_menu_frame)
         self.init_ui()
 
 
@@ -1143,6 +2274,7 @@ class TimelineWidget(QWidget):
         self.layer_list.itemClicked.connect(self.change_layer)
         self.layer_list.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.layer_list.customContextMenuRequested.connect(self.show_layer_context_menu)
+        # Estilo para el QListWidget y sus items (se aplica una sola vez)
         self.layer_list.setStyleSheet("""
             QListWidget {
                 background-color: #2b2b2b;
@@ -1150,14 +2282,13 @@ class TimelineWidget(QWidget):
             }
             QListWidget::item {
                 color: white;
-                padding: 5px;
-                border-radius: 3px;
-                margin: 2px;
+                padding: 0px;         /* Eliminar padding completamente */
+                margin: 0px;          /* Eliminar margen completamente */
+                height: 22px;         /* Altura fija para cada item */
             }
             QListWidget::item:selected {
                 background-color: #0078D7;
                 color: white;
-                font-weight: bold;
             }
             QListWidget::item:hover {
                 background-color: #404040;
@@ -1210,16 +2341,24 @@ class TimelineWidget(QWidget):
         controls_header.addStretch()
         frames_panel.addLayout(controls_header)
 
-        # Grid de frames con scroll
-        self.frame_grid = QGridLayout()
-        self.frame_grid.setSpacing(2)
-
-        scroll_area = QScrollArea()
-        frame_container = QWidget()
-        frame_container.setLayout(self.frame_grid)
-        scroll_area.setWidget(frame_container)
-        scroll_area.setWidgetResizable(True)
-        frames_panel.addWidget(scroll_area)
+        # Grid de frames con scroll. Los botones se ubican a mano sobre el
+        # contenedor, que tiene el tamaño del grid completo aunque solo se
+        # creen las columnas que entran en la vista
+        self.frame_scroll = QScrollArea()
+        self.frame_container = QWidget()
+        # Los botones no manejan el menú contextual: el evento sube al
+        # contenedor, que resuelve la celda con childAt()
+        self.frame_container.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.frame_container.customContextMenuRequested.connect(self._on_frame_grid_context_menu)
+        # El resaltado del frame actual se resuelve con una propiedad: la
+        # hoja de estilo se interpreta una sola vez aquí y no por botón
+        self.frame_container.setStyleSheet(
+            'QPushButton[current="true"] { background-color: lightblue; }'
+        )
+        self.frame_scroll.setWidget(self.frame_container)
+        self.frame_scroll.setWidgetResizable(True)
+        self.frame_scroll.horizontalScrollBar().valueChanged.connect(self._on_frame_scroll)
+        frames_panel.addWidget(self.frame_scroll)
 
         # Agregar los paneles al timeline_panel
         timeline_panel.addLayout(layers_panel, 1)
@@ -1266,12 +2405,36 @@ class TimelineWidget(QWidget):
 
     def update_playback_speed(self, value):
         self.play_timer.setInterval(1000 // value)
+        self._interval_ms = 1000 / value
+        if self.playing:
+            self._next_due_ms = self._play_elapsed.elapsed() + self._interval_ms
+        # El refresco diferido nunca debe tardar más que un cuadro
+        self._refresh_timer.setInterval(min(FRAME_INTERVAL_MS, 1000 // value))
         self.fps_label.setText(f"{value} FPS")
 
+    def toast(self, text):
+        """Muestra un aviso breve en la esquina del timeline sin bloquear la interfaz"""
+        self._toast.setText(text)
+        self._toast.adjustSize()
+        self._toast.move(self.width() - self._toast.width() - 8, 8)
+        self._toast.raise_()
+        self._toast.show()
+        # Un aviso nuevo reemplaza al anterior y reinicia su tiempo
+        self._toast_timer.start()
+
+    def _schedule_refresh(self):
+        """Pide actualizar la interfaz y el canvas como mucho una vez por cuadro"""
+        if not self._refresh_timer.isActive():
+            self._refresh_timer.start()
+
+    def _do_refresh(self):
+        self.update_lists()
+        self.canvas.draw_current_frame()
+
     def copy_layer(self):
         if self.canvas.current_layer < len(self.canvas.layers):
             self.copied_layer = self.canvas.layers[self.canvas.current_layer].copy()
-            QMessageBox.information(self, "Éxito", f"Capa '{self.copied_layer.name}' copiada.")
+            self.toast(f"Capa '{self.copied_layer.name}' copiada.")
 
     def paste_layer(self):
         if self.copied_layer:
@@ -1279,50 +2442,200 @@ class TimelineWidget(QWidget):
             new_layer.index = len(self.canvas.layers)
             new_layer.name += f" (copia)"
             self.canvas.layers.insert(0, new_layer)
-            self.update_lists()
-            self.canvas.draw_current_frame()
-            QMessageBox.information(self, "Éxito", f"Capa '{new_layer.name}' pegada.")
+            self.canvas._frames_grew(len(new_layer.frames))
+            self._schedule_refresh()
+            self.toast(f"Capa '{new_layer.name}' pegada.")
 
-    def update_frame_grid(self):
-        # Limpiar grid existente
-        while self.frame_grid.count():
-            item = self.frame_grid.takeAt(0)
-            if item.widget():
-                item.widget().deleteLater()
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        # Al cambiar el ancho de la vista pueden entrar o salir columnas
+        self._on_frame_scroll()
+
+    def _visible_columns(self, max_frames):
+        """Rango [primera, última) de columnas que entran en la vista del grid"""
+        offset = self.frame_scroll.horizontalScrollBar().value() - self.FRAME_GRID_MARGIN
+        first = max(0, offset // self.FRAME_CELL)
+        last = first + self.frame_scroll.viewport().width() // self.FRAME_CELL + 2
+        return min(first, max_frames), min(last, max_frames)
+
+    def _on_frame_scroll(self, *args):
+        if self._visible_columns(self.canvas._max_frame_count) != self._grid_window:
+            self.update_frame_grid()
 
-        if self.canvas.layers:
-            max_frames = max(len(layer.frames) for layer in self.canvas.layers)
+    def update_frame_grid(self):
+        """
+        Sincroniza el grid con las capas. Solo hay botones para las columnas
+        visibles y se reutilizan: se reconfiguran las filas cuya cantidad de
+        frames o visibilidad cambió, o todas si la vista se desplazó.
+        """
+        layers = self.canvas.layers
+        rows = len(layers)
+        max_frames = self.canvas._max_frame_count
+        cell, margin = self.FRAME_CELL, self.FRAME_GRID_MARGIN
+        self.frame_container.setMinimumSize(max_frames * cell + 2 * margin,
+                                            rows * cell + 2 * margin)
+        window = self._visible_columns(max_frames)
+        first, last = window
+        
+        # Guardar las celdas que quedaron fuera del grid o de la vista
+        for key in [k for k in self._frame_buttons
+                    if k[0] >= rows or not first <= k[1] < last]:
+            self._release_frame_button(key)
+        del self._grid_row_state[rows:]
+        
+        # Usar el mismo orden que en la lista de capas
+        for ui_row, layer in enumerate(layers):
+            state = (len(layer.frames), layer.visible)
+            if ui_row < len(self._grid_row_state):
+                if self._grid_row_state[ui_row] == state and window == self._grid_window:
+                    continue
+                self._grid_row_state[ui_row] = state
+            else:
+                self._grid_row_state.append(state)
             
-            # Usar el mismo orden que en la lista de capas
-            for ui_row, layer in enumerate(self.canvas.layers):
-                for col in range(max_frames):
-                    frame_btn = QPushButton()
-                    frame_btn.setFixedSize(30, 30)
-                    
-                    if col < len(layer.frames):
-                        frame_btn.setText(f"{col+1}")
-                        frame_btn.setProperty("col", col)
-                        frame_btn.setProperty("row", ui_row)
-                        frame_btn.clicked.connect(self.on_frame_clicked)
-                        
-                        # Configurar menú contextual
-                        frame_btn.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
-                        frame_btn.customContextMenuRequested.connect(
-                            lambda pos, r=ui_row, c=col: self.show_frame_context_menu(pos, r, c)
-                        )
-                        
-                        # Resaltar el frame actual
-                        if ui_row == self.canvas.current_layer and col == self.canvas.current_frame:
-                            frame_btn.setStyleSheet("background-color: lightblue;")
-                        else:
-                            frame_btn.setStyleSheet("")
+            frame_count, visible = state
+            for col in range(first, last):
+                frame_btn = self._frame_buttons.get((ui_row, col))
+                if frame_btn is None:
+                    frame_btn = self._create_frame_button(ui_row, col)
+                
+                # Deshabilitar el botón si la capa está invisible
+                frame_btn.setEnabled(visible and col < frame_count)
+        
+        self._grid_window = window
+        # Las miniaturas se revisan en todas las celdas: el contenido puede
+        # cambiar aunque la fila no (p. ej. al intercambiar dos capas)
+        for row, col in self._frame_buttons:
+            self.refresh_thumbnail(row, col)
+        self.refresh_current_highlight(force=True)
+
+    def _create_frame_button(self, ui_row, col):
+        frame_id = ui_row * self.FRAME_ID_STRIDE + col
+        if self._spare_buttons:
+            frame_btn = self._spare_buttons.pop()
+            self._frame_group.setId(frame_btn, frame_id)
+        else:
+            frame_btn = QPushButton(self.frame_container)
+            frame_btn.setFixedSize(30, 30)
+            frame_btn.setIconSize(QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+            self._frame_group.addButton(frame_btn, frame_id)
+        frame_btn.setToolTip(f"{col+1}")
+        frame_btn.move(self.FRAME_GRID_MARGIN + col * self.FRAME_CELL,
+                       self.FRAME_GRID_MARGIN + ui_row * self.FRAME_CELL)
+        frame_btn.show()
+        
+        self._frame_buttons[(ui_row, col)] = frame_btn
+        return frame_btn
+
+    def _release_frame_button(self, key):
+        """Saca una celda del grid y deja su botón limpio para reutilizarlo"""
+        frame_btn = self._frame_buttons.pop(key)
+        frame_btn.hide()
+        if self._cell_thumbs.pop(key, None) is not None:
+            frame_btn.setIcon(QIcon())
+        frame_btn.setText("")
+        if key == self._last_highlight:
+            self._set_current_property(frame_btn, False)
+            self._last_highlight = None
+        self._spare_buttons.append(frame_btn)
+
+    def refresh_thumbnail(self, row, col):
+        """
+        Muestra la miniatura del frame en su celda. Si no está en caché se
+        encarga al pool de hilos y la celda conserva lo que mostraba (el
+        número del frame o la miniatura anterior) hasta que llegue.
+        """
+        frame_btn = self._frame_buttons.get((row, col))
+        if frame_btn is None:
+            return
+        layers = self.canvas.layers
+        key = layers[row].frame_key(col) if row < len(layers) else None
+        
+        if key is None:
+            if self._cell_thumbs.pop((row, col), None) is not None:
+                frame_btn.setIcon(QIcon())
+            frame_btn.setText("")
+            return
+        
+        if self._cell_thumbs.get((row, col)) == key:
+            return
+        
+        pixmap = QPixmapCache.find(self._thumb_cache_key(key))
+        if pixmap is None:
+            if (row, col) not in self._cell_thumbs:
+                frame_btn.setText(f"{col+1}")
+            waiting = self._thumb_pending.get(key)
+            if waiting is None:
+                self._thumb_pending[key] = {(row, col)}
+                self._start_thumbnail(key, layers[row].frame_source(col))
+            else:
+                waiting.add((row, col))
+            return
+        
+        frame_btn.setIcon(QIcon(pixmap))
+        frame_btn.setText("")
+        self._cell_thumbs[(row, col)] = key
 
-                        # Deshabilitar el botón si la capa está invisible
-                        frame_btn.setEnabled(layer.visible)
-                    else:
-                        frame_btn.setEnabled(False)
-                    
-                    self.frame_grid.addWidget(frame_btn, ui_row, col)
+    def prewarm_thumbnails(self):
+        """
+        Encarga al pool de hilos las miniaturas de todos los frames, no solo
+        los visibles, para que desplazarse por el timeline ya las encuentre.
+        Los frames que comparten datos (p. ej. los vacíos) se generan una vez.
+        Los que siguen en PNG se decodifican en el pool, sin cargarlos en la capa.
+        """
+        for layer in self.canvas.layers:
+            for index in range(len(layer.frames)):
+                key = layer.frame_key(index)
+                if key in self._thumb_pending or QPixmapCache.find(self._thumb_cache_key(key)) is not None:
+                    continue
+                self._thumb_pending[key] = set()
+                self._start_thumbnail(key, layer.frame_source(index))
+
+    def _start_thumbnail(self, key, frame):
+        """Encarga al pool la miniatura de un frame (QImage o PNG)"""
+        if isinstance(frame, QImage):
+            # Copia superficial: si el frame se edita mientras tanto,
+            # Qt lo separa y la tarea sigue leyendo los datos viejos
+            frame = QImage(frame)
+        self._thumb_pool.start(ThumbnailTask(key, frame, self._thumb_signals))
+
+    @staticmethod
+    def _thumb_cache_key(key):
+        return f"belleza-thumb-{key}"
+
+    def _on_thumbnail_ready(self, key, thumb):
+        cells = self._thumb_pending.pop(key, ())
+        QPixmapCache.insert(self._thumb_cache_key(key), QPixmap.fromImage(thumb))
+        for row, col in cells:
+            self.refresh_thumbnail(row, col)
+
+    @staticmethod
+    def _set_current_property(frame_btn, current):
+        frame_btn.setProperty("current", current)
+        # Reaplicar el estilo solo a este botón
+        frame_btn.style().unpolish(frame_btn)
+        frame_btn.style().polish(frame_btn)
+
+    def refresh_current_highlight(self, force=False):
+        """Mueve el resaltado al frame actual tocando solo los dos botones afectados"""
+        key = (self.canvas.current_layer, self.canvas.current_frame)
+        if key == self._last_highlight and not force:
+            return
+        
+        previous = self._frame_buttons.get(self._last_highlight)
+        if previous is not None:
+            self._set_current_property(previous, False)
+            # El frame que se deja es el que pudo haberse editado
+            self.refresh_thumbnail(*self._last_highlight)
+        
+        # Resaltar el frame actual
+        row, col = key
+        current = self._frame_buttons.get(key)
+        if current is not None and col < self._grid_row_state[row][0]:
+            self._set_current_property(current, True)
+            self._last_highlight = key
+        else:
+            self._last_highlight = None
 
     
     def toggle_layer_visibility(self, layer_index):
@@ -1330,82 +2643,86 @@ class TimelineWidget(QWidget):
             layer = self.canvas.layers[layer_index]
             layer.visible = not layer.visible
             
-            # Actualizar la interfaz
-            self.update_lists()
+            # Actualizar solo el ojo de esa fila y su fila del grid
+            self.set_visibility_icon(layer_index)
+            self.update_frame_grid()
             self.canvas.draw_current_frame()
    
     def update_lists(self):
-        self.layer_list.clear()
-        
-        # Estilo para el QListWidget y sus items
-        self.layer_list.setStyleSheet("""
-            QListWidget {
-                background-color: #2b2b2b;
-                border: 1px solid #3b3b3b;
-            }
-            QListWidget::item {
-                color: white;
-                padding: 0px;         /* Eliminar padding completamente */
-                margin: 0px;          /* Eliminar margen completamente */
-                height: 22px;         /* Altura fija para cada item */
-            }
-            QListWidget::item:selected {
-                background-color: #0078D7;
-                color: white;
+        """
+        Sincroniza la lista de capas reutilizando las filas existentes: solo
+        se crean o eliminan filas cuando cambia la cantidad de capas.
+        """
+        layer_count = len(self.canvas.layers)
+        while len(self._layer_items) > layer_count:
+            self._layer_items.pop()
+            self.layer_list.takeItem(len(self._layer_items))
+        while len(self._layer_items) < layer_count:
+            self._layer_items.append(self._create_layer_item(len(self._layer_items)))
+        
+        for i in range(layer_count):
+            self.set_visibility_icon(i)
+            self.set_layer_name(i)
+        self.set_current_row(self.canvas.current_layer)
+
+        self.update_frame_grid()
+
+    def _create_layer_item(self, i):
+        # Widget contenedor con layout horizontal
+        item_widget = QWidget()
+        item_layout = QHBoxLayout(item_widget)
+        item_layout.setContentsMargins(2, 0, 2, 0)  # Márgenes mínimos
+        item_layout.setSpacing(4)                    # Espacio entre el ojo y el texto
+        
+        # Botón de visibilidad (ojo)
+        visibility_btn = QPushButton()
+        visibility_btn.setFixedSize(18, 18)          # Tamaño más pequeño para el botón
+        visibility_btn.setStyleSheet("""
+            QPushButton {
+                background: transparent;
+                border: none;
+                padding: 0px;
+                font-size: 12px;
             }
-            QListWidget::item:hover {
-                background-color: #404040;
+        """)
+        visibility_btn.clicked.connect(lambda checked, idx=i: self.toggle_layer_visibility(idx))
+        
+        # Etiqueta del nombre de la capa
+        name_label = QLabel()
+        name_label.setStyleSheet("""
+            QLabel {
+                padding: 0px;
+                font-size: 12px;
             }
         """)
+        
+        # Agregar widgets al layout
+        item_layout.addWidget(visibility_btn)
+        item_layout.addWidget(name_label, 1)
+        
+        # Crear y configurar el item
+        item = QListWidgetItem()
+        item.setSizeHint(QSize(item_widget.sizeHint().width(), 22))  # Altura fija
+        
+        # Agregar a la lista
+        self.layer_list.addItem(item)
+        self.layer_list.setItemWidget(item, item_widget)
+        return item, visibility_btn, name_label
 
-        # Crear items para cada capa
-        for i, layer in enumerate(self.canvas.layers):
-            # Widget contenedor con layout horizontal
-            item_widget = QWidget()
-            item_layout = QHBoxLayout(item_widget)
-            item_layout.setContentsMargins(2, 0, 2, 0)  # Márgenes mínimos
-            item_layout.setSpacing(4)                    # Espacio entre el ojo y el texto
-            
-            # Botón de visibilidad (ojo)
-            visibility_btn = QPushButton('👁' if layer.visible else '⭕')
-            visibility_btn.setFixedSize(18, 18)          # Tamaño más pequeño para el botón
-            visibility_btn.setStyleSheet("""
-                QPushButton {
-                    background: transparent;
-                    border: none;
-                    padding: 0px;
-                    font-size: 12px;
-                }
-            """)
-            visibility_btn.clicked.connect(lambda checked, idx=i: self.toggle_layer_visibility(idx))
-            
-            # Etiqueta del nombre de la capa
-            name_label = QLabel(layer.name)
-            name_label.setStyleSheet("""
-                QLabel {
-                    padding: 0px;
-                    font-size: 12px;
-                }
-            """)
-            
-            # Agregar widgets al layout
-            item_layout.addWidget(visibility_btn)
-            item_layout.addWidget(name_label, 1)
-            
-            # Crear y configurar el item
-            item = QListWidgetItem()
-            item.setSizeHint(QSize(item_widget.sizeHint().width(), 22))  # Altura fija
-            
-            # Agregar a la lista
-            self.layer_list.addItem(item)
-            self.layer_list.setItemWidget(item, item_widget)
-            
-            # Seleccionar si es la capa actual
-            if i == self.canvas.current_layer:
-                self.layer_list.setCurrentItem(item)
-                item.setSelected(True)
+    def set_visibility_icon(self, i):
+        layer = self.canvas.layers[i]
+        self._layer_items[i][1].setText('👁' if layer.visible else '⭕')
+
+    def set_layer_name(self, i):
+        self._layer_items[i][2].setText(self.canvas.layers[i].name)
+
+    def set_current_row(self, i):
+        # Seleccionar si es la capa actual
+        if 0 <= i < len(self._layer_items):
+            item = self._layer_items[i][0]
+            self.layer_list.setCurrentItem(item)
+            item.setSelected(True)
 
-        self.update_frame_grid()
     def update_layer_selection_style(self):
         # Actualizar estilos para todos los items
         for i in range(self.layer_list.count()):
@@ -1431,43 +2748,51 @@ class TimelineWidget(QWidget):
         self.update_frame_grid()
 
     def show_frame_context_menu(self, pos, row, col):
-        menu = QMenu(self)
-        
-        copy_frame_action = QAction("Copiar fotograma", self)
-        copy_frame_action.triggered.connect(lambda: self.copy_frame(row, col))
-        menu.addAction(copy_frame_action)
-        
-        if self.copied_frame is not None:
-            paste_frame_action = QAction("Pegar fotograma", self)
-            paste_frame_action.triggered.connect(lambda: self.paste_frame(row, col))
-            menu.addAction(paste_frame_action)
-        
-        menu.exec(self.sender().mapToGlobal(pos))
+        self._menu_cell = (row, col)
+        self._paste_frame_action.setVisible(self.copied_frame is not None)
+        self._frame_menu.exec(self.frame_container.mapToGlobal(pos))
+
+    # Slots del menú contextual: métodos y no lambdas, así PyQt asocia la
+    # conexión a este widget y la corta si el widget se destruye
+    def _copy_menu_frame(self):
+        self.copy_frame(*self._menu_cell)
+
+    def _paste_menu_frame(self):
+        self.paste_frame(*self._menu_cell)
 
     def copy_frame(self, row, col):
         if row < len(self.canvas.layers):
             layer = self.canvas.layers[row]
-            if col in layer.frames:
-                self.copied_frame = layer.copy_frame(col)
-                QMessageBox.information(self, "Éxito", f"Fotograma {col+1} de '{layer.name}' copiado.")
+            if col < len(layer.frames):
+                # Copia superficial: QImage comparte los datos y recién los
+                # duplica si se pinta sobre el frame (el pegado hace su copia)
+                self.copied_frame = QImage(layer.frames[col])
+                self.toast(f"Fotograma {col+1} de '{layer.name}' copiado.")
 
     def paste_frame(self, row, col):
         if self.copied_frame and row < len(self.canvas.layers):
             layer = self.canvas.layers[row]
-            layer.frames[col] = self.copied_frame.copy()
-            self.update_lists()
-            self.canvas.draw_current_frame()
-            QMessageBox.information(self, "Éxito", f"Fotograma pegado en '{layer.name}'.")
-
-    def on_frame_clicked(self):
-        sender = self.sender()
-        if sender:
-            col = sender.property("col")
-            row = sender.property("row")
-            self.canvas.current_layer = row
-            self.canvas.change_frame(col)
-            self.update_lists()
-            self.canvas.setFocus()
+            layer.set_frame(col, self.copied_frame.copy())
+            self.canvas._frames_grew(len(layer.frames))
+            self._schedule_refresh()
+            self.toast(f"Fotograma pegado en '{layer.name}'.")
+
+    def _on_frame_id_clicked(self, frame_id):
+        row, col = divmod(frame_id, self.FRAME_ID_STRIDE)
+        self.canvas.current_layer = row
+        self.canvas.change_frame(col)
+        self.set_current_row(row)
+        self.refresh_current_highlight()
+        self.canvas.setFocus()
+
+    def _on_frame_grid_context_menu(self, pos):
+        frame_btn = self.frame_container.childAt(pos)
+        frame_id = self._frame_group.id(frame_btn) if frame_btn is not None else -1
+        # Solo las celdas activas (con frame y capa visible) tienen menú
+        if frame_id < 0 or not frame_btn.isEnabled():
+            return
+        row, col = divmod(frame_id, self.FRAME_ID_STRIDE)
+        self.show_frame_context_menu(pos, row, col)
 
     def change_layer(self, item):
         ui_index = self.layer_list.row(item)
@@ -1482,12 +2807,17 @@ class TimelineWidget(QWidget):
         self.canvas.update()
     def toggle_playback(self):
         self.playing = not self.playing
+        self.canvas.set_playback(self.playing)
         if self.playing:
             self.play_button.setText("⏸")
+            self._play_elapsed.start()
+            self._next_due_ms = self._interval_ms
             self.play_timer.start()
         else:
             self.play_button.setText("▶")
             self.play_timer.stop()
+            # Durante la reproducción el grid no se toca
+            self.refresh_current_highlight()
 
     def next_frame(self):
         if not self.canvas.layers:
@@ -1499,9 +2829,17 @@ class TimelineWidget(QWidget):
             
         total_frames = len(current_layer.frames)
         if total_frames > 1:
-            next_frame = (self.canvas.current_frame + 1) % total_frames
+            skip = 1
+            if self.playing:
+                # Si vamos atrasados se avanzan varios frames de una vez
+                behind = self._play_elapsed.elapsed() - self._next_due_ms
+                if behind > 0:
+                    skip += int(behind // self._interval_ms)
+                self._next_due_ms += skip * self._interval_ms
+            next_frame = (self.canvas.current_frame + skip) % total_frames
             self.canvas.change_frame(next_frame)
-            self.update_frame_grid()
+            if not self.playing:
+                self.refresh_current_highlight()
 
     
    
@@ -1535,21 +2873,21 @@ class TimelineWidget(QWidget):
         # Actualizar los índices de todas las capas
         for i, layer in enumerate(self.canvas.layers):
             layer.index = i
+        self.canvas._frames_grew(len(new_layer.frames))
         
         # Actualizar la interfaz
-        self.update_lists()
-        self.canvas.draw_current_frame()
+        self._schedule_refresh()
         
         # Mostrar mensaje de éxito
-        QMessageBox.information(self, "Éxito", f"Capa '{new_layer.name}' añadida.")
+        self.toast(f"Capa '{new_layer.name}' añadida.")
     def delete_layer(self):
         if len(self.canvas.layers) > 1:
             deleted_layer = self.canvas.layers.pop(self.canvas.current_layer)
             if self.canvas.current_layer >= len(self.canvas.layers):
                 self.canvas.current_layer = len(self.canvas.layers) - 1
-            self.update_lists()
-            self.canvas.draw_current_frame()
-            QMessageBox.information(self, "Éxito", f"Capa '{deleted_layer.name}' eliminada.")
+            self.canvas._frames_shrank(len(deleted_layer.frames))
+            self._schedule_refresh()
+            self.toast(f"Capa '{deleted_layer.name}' eliminada.")
         else:
             QMessageBox.warning(self, "Advertencia", "No se puede eliminar la única capa existente.")
 
@@ -1559,28 +2897,11 @@ class TimelineWidget(QWidget):
             current_frame_index = self.canvas.current_frame
             
             # Crear nuevo frame vacío con el tamaño actual del canvas
-            new_frame = QImage(current_layer.width, current_layer.height, 
-                            QImage.Format.Format_ARGB32_Premultiplied)
-            new_frame.fill(Qt.GlobalColor.transparent)
+            new_frame = blank_frame(current_layer.width, current_layer.height)
             
-            # Crear diccionario temporal para los frames
-            new_frames = {}
-            
-            # Copiar frames existentes hasta el frame actual
-            for i in range(current_frame_index + 1):
-                if i in current_layer.frames:
-                    new_frames[i] = current_layer.frames[i]
-            
-            # Insertar nuevo frame
-            new_frames[current_frame_index + 1] = new_frame
-            
-            # Copiar frames restantes
-            for i in sorted(current_layer.frames.keys()):
-                if i > current_frame_index:
-                    new_frames[i + 1] = current_layer.frames[i]
-            
-            # Actualizar frames de la capa
-            current_layer.frames = new_frames
+            # Insertar el nuevo frame después del actual
+            current_layer.frames.insert(current_frame_index + 1, new_frame)
+            self.canvas._frames_grew(len(current_layer.frames))
             
             # Actualizar frame actual
             self.canvas.current_frame = current_frame_index + 1
@@ -1589,8 +2910,7 @@ class TimelineWidget(QWidget):
             current_layer._save_state()
             
             # Actualizar interfaz
-            self.update_lists()
-            self.canvas.draw_current_frame()
+            self._schedule_refresh()
             
     def delete_frame(self):
         if not self.canvas.layers:
@@ -1604,38 +2924,24 @@ class TimelineWidget(QWidget):
         # Guardar el índice actual antes de eliminar
         current_frame = self.canvas.current_frame
         
-        # Obtener lista ordenada de índices antes de eliminar
-        frame_indices = sorted(list(current_layer.frames.keys()))
-        if current_frame not in frame_indices:
+        if current_frame >= len(current_layer.frames):
             return
             
-        # Eliminar el frame actual
-        del current_layer.frames[current_frame]
-        
-        # Crear nuevo diccionario para reordenar frames
-        new_frames = {}
-        new_index = 0
-        
-        # Reordenar los frames manteniendo el orden secuencial
-        for old_index in sorted(current_layer.frames.keys()):
-            new_frames[new_index] = current_layer.frames[old_index]
-            new_index += 1
-        
-        # Actualizar frames de la capa
-        current_layer.frames = new_frames
+        # Eliminar el frame actual; los siguientes se corren solos
+        current_layer.frames.pop(current_frame)
+        self.canvas._frames_shrank(len(current_layer.frames) + 1)
         
         # Ajustar el frame actual
-        if current_frame >= len(new_frames):
-            self.canvas.current_frame = len(new_frames) - 1
+        if current_frame >= len(current_layer.frames):
+            self.canvas.current_frame = len(current_layer.frames) - 1
         else:
             self.canvas.current_frame = current_frame
             
         # Actualizar la interfaz
-        self.update_lists()
-        self.canvas.draw_current_frame()
+        self._schedule_refresh()
         
         # Mostrar mensaje de éxito
-        QMessageBox.information(self, "Éxito", f"Fotograma {current_frame + 1} eliminado.")
+        self.toast(f"Fotograma {current_frame + 1} eliminado.")
         
     def handle_rename_layer(self):
         selected_items = self.layer_list.selectedItems()
@@ -1665,8 +2971,8 @@ class TimelineWidget(QWidget):
             layer = self.canvas.layers[layer_index]
             old_name = layer.name
             layer.name = new_name
-            self.update_lists()
-            QMessageBox.information(self, "Éxito", f"Capa renombrada de '{old_name}' a '{new_name}'.")
+            self.set_layer_name(layer_index)
+            self.toast(f"Capa renombrada de '{old_name}' a '{new_name}'.")
         else:
             QMessageBox.c
     def move_layer_up(self):
@@ -1687,8 +2993,7 @@ class TimelineWidget(QWidget):
             self.canvas.current_layer = next_idx
             
             # Actualizar la interfaz
-            self.update_lists()
-            self.canvas.draw_current_frame()
+            self._schedule_refresh()
 
     def move_layer_down(self):
         # Mover una capa hacia abajo significa que se dibujará antes (debajo)
@@ -1708,8 +3013,7 @@ class TimelineWidget(QWidget):
             self.canvas.current_layer = prev_idx
             
             # Actualizar la interfaz
-            self.update_lists()
-            self.canvas.draw_current_frame()
+            self._schedule_refresh()
 
 
 class SelectionTool:
@@ -1751,24 +3055,17 @@ class SelectionTool:
             self.selection_rect[1] = new_y
 
     def apply_selection_tool(layer, frame_index, selection_tool):
-        if frame_index in layer.frames:
+        if frame_index < len(layer.frames):
             frame = layer.frames[frame_index]
             if selection_tool.selection_rect:
                 # Copiar el contenido seleccionado
                 x, y, w, h = selection_tool.selection_rect
-                selected_area = QImage(w, h, QImage.Format.Format_ARGB32_Premultiplied)
-                selected_area.fill(Qt.GlobalColor.transparent)
-                
-                painter = QPainter(selected_area)
-                painter.drawImage(0, 0, frame, x, y, w, h)
-                painter.end()
-                
-                selection_tool.selected_content = selected_area
+                selection_tool.selected_content = frame.copy(QRect(x, y, w, h))
 
     def move_selected_content(self):
         if self.current_layer < len(self.layers):
             current_layer = self.layers[self.current_layer]  # Get the actual layer object
-            if self.current_frame in current_layer.frames and self.selection_tool.selected_content:
+            if self.current_frame < len(current_layer.frames) and self.selection_tool.selected_content:
                 frame = current_layer.frames[self.current_frame]
                 new_frame = QImage(frame.size(), QImage.Format.Format_ARGB32_Premultiplied)
                 new_frame.fill(Qt.GlobalColor.transparent)
@@ -1794,6 +3091,13 @@ class AnimationApp(QMainWindow):
         # Inicializar atributos de transformación
         self.offset = QPoint(0, 0)
         self.scale_factor = 1.0
+        # Repintado diferido para los sliders: arrastrarlos emite decenas de
+        # cambios por segundo y alcanza con repintar una vez por fotograma
+        self._pending_update = coalescing_timer(self, FRAME_INTERVAL_MS, self._flush_canvas_update)
+        # Igual para arrastrar la ventana: el mouse puede reportar cientos de
+        # movimientos por segundo y la ventana se mueve una vez por fotograma
+        self._pending_move_pos = None
+        self._pending_move = coalescing_timer(self, FRAME_INTERVAL_MS, self._apply_pending_move)
         # Eliminar la barra de título predeterminada
         self.setWindowFlags(Qt.WindowType.FramelessWindowHint)
         self.init_ui()
@@ -1819,6 +3123,7 @@ class AnimationApp(QMainWindow):
 
         # Crear canvas y timeline
         self.canvas = AnimationCanvas()
+        self.canvas._main_window = self
         self.timeline_widget = TimelineWidget(self.canvas)
 
         # Configurar atajos de teclado
@@ -1996,13 +3301,13 @@ class AnimationApp(QMainWindow):
     def update_aa_quality(self, value):
         """Update anti-aliasing quality level"""
         self.canvas.aa_manager.set_quality_level(value)
-        self.canvas.update()
+        self._schedule_canvas_update()
         
     def update_opacity(self, value):
         print(f"Opacidad actualizada: {value}%")  # Debug
         self.canvas.pen_opacity = value
         self.opacity_label.setText(f"{value}%")
-        self.canvas.update()
+        self._schedule_canvas_update()
     def toggle_anti_aliasing(self):
         """Toggles anti-aliasing and updates button text"""
         is_enabled = self.aa_toggle.isChecked()
@@ -2010,65 +3315,45 @@ class AnimationApp(QMainWindow):
         self.aa_toggle.setText("Activado" if is_enabled else "Desactivado")
         self.canvas.draw_current_frame()
     def setup_shortcuts(self):
+        # Las teclas se dan como StandardKey o Qt.Key (sin interpretar texto)
+        # y el slot va directo en el constructor de cada atajo
         # Keep existing shortcuts
-        self.copy_shortcut = QShortcut(QKeySequence.StandardKey.Copy, self)
-        self.copy_shortcut.activated.connect(self.copy_current_frame)
-        
-        self.paste_shortcut = QShortcut(QKeySequence.StandardKey.Paste, self)
-        self.paste_shortcut.activated.connect(self.paste_current_frame)
+        self.copy_shortcut = QShortcut(QKeySequence.StandardKey.Copy, self, self.copy_current_frame)
+        self.paste_shortcut = QShortcut(QKeySequence.StandardKey.Paste, self, self.paste_current_frame)
         
         # Add F5 shortcut for frame duplication
-        self.duplicate_shortcut = QShortcut(QKeySequence("F5"), self)
-        self.duplicate_shortcut.activated.connect(self.duplicate_frame)
-
-        # Tool shortcuts
-        self.pencil_shortcut = QShortcut(QKeySequence("1"), self)
-        self.pencil_shortcut.activated.connect(lambda: self.canvas.set_tool("pencil"))
-
-        self.eraser_shortcut = QShortcut(QKeySequence("2"), self)
-        self.eraser_shortcut.activated.connect(lambda: self.canvas.set_tool("eraser"))
-
-        self.bucket_shortcut = QShortcut(QKeySequence("3"), self)
-        self.bucket_shortcut.activated.connect(lambda: self.canvas.set_tool("bucket"))
+        self.duplicate_shortcut = QShortcut(QKeySequence(Qt.Key.Key_F5), self, self.duplicate_frame)
 
-        self.selection_shortcut = QShortcut(QKeySequence("4"), self)
-        self.selection_shortcut.activated.connect(lambda: self.canvas.set_tool("selection"))
+        # Tool shortcuts (partial: sin una lambda intermedia por atajo)
+        self.pencil_shortcut = QShortcut(QKeySequence(Qt.Key.Key_1), self, partial(self.canvas.set_tool, "pencil"))
+        self.eraser_shortcut = QShortcut(QKeySequence(Qt.Key.Key_2), self, partial(self.canvas.set_tool, "eraser"))
+        self.bucket_shortcut = QShortcut(QKeySequence(Qt.Key.Key_3), self, partial(self.canvas.set_tool, "bucket"))
+        self.selection_shortcut = QShortcut(QKeySequence(Qt.Key.Key_4), self, partial(self.canvas.set_tool, "selection"))
         
         # Add new shortcuts here
-        self.color_shortcut = QShortcut(QKeySequence("5"), self)
-        self.color_shortcut.activated.connect(self.show_color_dialog)
-
-        self.onion_skin_shortcut = QShortcut(QKeySequence("6"), self)
-        self.onion_skin_shortcut.activated.connect(self.canvas.toggle_onion_skin)
+        self.color_shortcut = QShortcut(QKeySequence(Qt.Key.Key_5), self, self.show_color_dialog)
+        self.onion_skin_shortcut = QShortcut(QKeySequence(Qt.Key.Key_6), self, self.canvas.toggle_onion_skin)
 
         # Pen size shortcuts
-        self.increase_size = QShortcut(QKeySequence("+"), self)
-        self.increase_size.activated.connect(self._increase_pen_size)
-
-        self.decrease_size = QShortcut(QKeySequence("-"), self)
-        self.decrease_size.activated.connect(self._decrease_pen_size)
+        self.increase_size = QShortcut(QKeySequence(Qt.Key.Key_Plus), self, partial(self._adjust_pen_size, 1))
+        self.decrease_size = QShortcut(QKeySequence(Qt.Key.Key_Minus), self, partial(self._adjust_pen_size, -1))
 
         # File operation shortcuts
-        self.open_shortcut = QShortcut(QKeySequence("Ctrl+O"), self)
-        self.open_shortcut.activated.connect(self.open_file)
-        
-        self.save_shortcut = QShortcut(QKeySequence("Ctrl+S"), self)
-        self.save_shortcut.activated.connect(self.save_file)
-        
-        self.import_shortcut = QShortcut(QKeySequence("Ctrl+I"), self)
-        self.import_shortcut.activated.connect(self.import_image)
+        self.open_shortcut = QShortcut(QKeySequence.StandardKey.Open, self, self.open_file)
+        self.save_shortcut = QShortcut(QKeySequence.StandardKey.Save, self, self.save_file)
+        self.import_shortcut = QShortcut(
+            QKeySequence(QKeyCombination(Qt.KeyboardModifier.ControlModifier, Qt.Key.Key_I)),
+            self, self.import_image
+        )
         
 
     
-    def _increase_pen_size(self):
-        current_size = self.canvas.pen_size
-        new_size = min(50, current_size + 1)  # Maximum size is 50
-        self.canvas.set_pen_size(new_size)
-        self.size_label.setText(str(new_size))
-
-    def _decrease_pen_size(self):
-        current_size = self.canvas.pen_size
-        new_size = max(1, current_size - 1)  # Minimum size is 1
+    def _adjust_pen_size(self, delta):
+        # El tamaño del pincel va de 1 a 50
+        new_size = max(1, min(50, self.canvas.pen_size + delta))
+        if new_size == self.canvas.pen_size:
+            # Ya está en el límite: nada que actualizar
+            return
         self.canvas.set_pen_size(new_size)
         self.size_label.setText(str(new_size))
     
@@ -2076,7 +3361,7 @@ class AnimationApp(QMainWindow):
         """Handles the frame duplication action."""
         if self.canvas.duplicate_current_frame():
             self.timeline_widget.update_lists()
-            QMessageBox.information(self, "Éxito", "Fotograma duplicado correctamente")
+            self.timeline_widget.toast("Fotograma duplicado correctamente")
         else:
             QMessageBox.warning(self, "Advertencia", "No se pudo duplicar el fotograma")
     def add_slider_control(self, parent_layout, label_text, min_val, max_val, default_val, callback):
@@ -2106,9 +3391,28 @@ class AnimationApp(QMainWindow):
                             self.canvas.set_onion_skin_opacity)
 
     def apply_styles(self):
+        # Los colores generales van en la paleta de la aplicación, que Qt
+        # aplica sin pasar por el motor de CSS; la hoja de estilo queda
+        # solo para lo que la paleta no puede expresar (bordes, hover)
+        background = QColor("#2b2b2b")
+        surface = QColor("#3b3b3b")
+        text = QColor("#ffffff")
+        palette = QPalette()
+        for role, color in (
+            (QPalette.ColorRole.Window, background),
+            (QPalette.ColorRole.WindowText, text),
+            (QPalette.ColorRole.Base, background),
+            (QPalette.ColorRole.AlternateBase, surface),
+            (QPalette.ColorRole.Text, text),
+            (QPalette.ColorRole.Button, surface),
+            (QPalette.ColorRole.ButtonText, text),
+            (QPalette.ColorRole.ToolTipBase, surface),
+            (QPalette.ColorRole.ToolTipText, text),
+        ):
+            palette.setColor(role, color)
+        QApplication.instance().setPalette(palette)
+
         self.setStyleSheet("""
-            QMainWindow { background-color: #2b2b2b; }
-            QWidget { background-color: #2b2b2b; color: #ffffff; }
             QPushButton {
                 background-color: #3b3b3b;
                 border: 1px solid #555555;
@@ -2118,7 +3422,6 @@ class AnimationApp(QMainWindow):
             }
             QPushButton:hover { background-color: #4b4b4b; }
             QPushButton#close_button:hover { background-color: #c42b1c; }
-            QLabel { color: #ffffff; }
             QSlider { background-color: transparent; }
             QSlider::handle { background-color: #555555; }
             QMenu {
@@ -2151,12 +3454,22 @@ class AnimationApp(QMainWindow):
         """Mueve la ventana mientras se arrastra."""
         if hasattr(self, 'drag_position'):
             if event.buttons() & Qt.MouseButton.LeftButton:
-                self.move(event.globalPosition().toPoint() - self.drag_position)
+                self._pending_move_pos = event.globalPosition().toPoint() - self.drag_position
+                if not self._pending_move.isActive():
+                    self._pending_move.start()
                 event.accept()
 
+    def _apply_pending_move(self):
+        if self._pending_move_pos is not None:
+            self.move(self._pending_move_pos)
+            self._pending_move_pos = None
+
     def mouseReleaseEvent(self, event):
         """Limpia la posición de arrastre cuando se suelta el botón del mouse."""
         if hasattr(self, 'drag_position'):
+            # La ventana queda exactamente donde se soltó
+            self._pending_move.stop()
+            self._apply_pending_move()
             del self.drag_position 
     
     def prompt_resize_canvas(self):
@@ -2180,7 +3493,16 @@ class AnimationApp(QMainWindow):
         """Updates the smoothing factor and label"""
         self.canvas.smoothing_factor = value
         self.smooth_label.setText(f"Nivel: {value}%")
+        self._schedule_canvas_update()
+
+    def _flush_canvas_update(self):
         self.canvas.update()
+
+    def _schedule_canvas_update(self):
+        # Los cambios mientras hay uno pendiente se juntan en ese repintado;
+        # no se reinicia el timer para que un arrastre largo igual repinte
+        if not self._pending_update.isActive():
+            self._pending_update.start()
     
     def open_file(self):
         file_name, _ = QFileDialog.getOpenFileName(
@@ -2192,28 +3514,46 @@ class AnimationApp(QMainWindow):
         
         if file_name:
             try:
-                with open(file_name, 'r') as f:
-                    data = json.load(f)
-                
+                # Los .anim actuales son un zip con un manifiesto y un PNG
+                # por frame; los anteriores, un único JSON con los PNG en base64
+                if zipfile.is_zipfile(file_name):
+                    with zipfile.ZipFile(file_name) as archive:
+                        data = json_loads(archive.read('manifest.json'))
+                        layers = [Layer.from_archive(layer_data, archive, layer_idx)
+                                  for layer_idx, layer_data in enumerate(data['layers'])]
+                else:
+                    with open(file_name, 'rb') as f:
+                        data = json_loads(f.read())
+                    layers = [Layer.from_dict(layer_data) for layer_data in data['layers']]
+                canvas_size = data['canvas_size']
+                background_color = QColor(data['background_color'])
+                current_frame = data['current_frame']
+                current_layer = data['current_layer']
+            except Exception as e:
+                # Archivo ilegible: el documento abierto queda como estaba
+                QMessageBox.critical(self, "Error", f"Error al abrir el archivo: {str(e)}")
+                return
+            
+            try:
                 # Limpiar canvas actual
                 self.canvas.layers.clear()
                 
                 # Restaurar propiedades del canvas
-                self.canvas.setFixedSize(*data['canvas_size'])
-                self.canvas.background_color = QColor(data['background_color'])
+                self.canvas.setFixedSize(*canvas_size)
+                self.canvas.background_color = background_color
                 
                 # Restaurar capas
-                for layer_data in data['layers']:
-                    new_layer = Layer.from_dict(layer_data)
-                    self.canvas.layers.append(new_layer)
+                self.canvas.layers.extend(layers)
+                self.canvas._refresh_max_frame_count()
                 
                 # Restaurar estados actuales
-                self.canvas.current_frame = data['current_frame']
-                self.canvas.current_layer = data['current_layer']
+                self.canvas.current_frame = current_frame
+                self.canvas.current_layer = current_layer
                 
                 # Actualizar interfaz
                 self.canvas.draw_current_frame()
                 self.timeline_widget.update_lists()
+                self.timeline_widget.prewarm_thumbnails()
                 
                 QMessageBox.information(self, "Éxito", "Archivo abierto correctamente")
                 
@@ -2222,6 +3562,12 @@ class AnimationApp(QMainWindow):
                 # Reiniciar el canvas en caso de error
                 self.canvas.layers.clear()
                 self.canvas._init_canvas()
+                self.canvas.current_frame = 0
+                self.canvas.current_layer = 0
+                self.canvas._refresh_max_frame_count()
+                self.timeline_widget.update_lists()
+                self.canvas.draw_current_frame()
+
     def setup_file_menu(self, file_menu):
         # Acciones del menú archivo
         menu_actions = [
@@ -2266,43 +3612,58 @@ class AnimationApp(QMainWindow):
                 if imported_image.isNull():
                     raise Exception("No se pudo cargar la imagen")
 
+                w, h = self.canvas.width(), self.canvas.height()
+
                 # Crear nueva capa para la imagen
                 new_layer = Layer(
-                    self.canvas.width(),
-                    self.canvas.height(),
+                    w,
+                    h,
                     index=len(self.canvas.layers),
                     name=f"Imagen {len(self.canvas.layers) + 1}"
                 )
 
                 # Preparar el frame para la imagen
-                frame = QImage(self.canvas.width(), self.canvas.height(), 
-                            QImage.Format.Format_ARGB32_Premultiplied)
+                frame = QImage(w, h, QImage.Format.Format_ARGB32_Premultiplied)
                 frame.fill(Qt.GlobalColor.transparent)
 
                 # Calcular las dimensiones para el escalado
-                canvas_ratio = self.canvas.width() / self.canvas.height()
+                canvas_ratio = w / h
                 image_ratio = imported_image.width() / imported_image.height()
 
                 if canvas_ratio > image_ratio:
                     # El canvas es más ancho que la imagen
-                    scaled_width = self.canvas.width()
+                    scaled_width = w
                     scaled_height = int(scaled_width / image_ratio)
                 else:
                     # El canvas es más alto que la imagen
-                    scaled_height = self.canvas.height()
+                    scaled_height = h
                     scaled_width = int(scaled_height * image_ratio)
 
                 # Escalar la imagen para que cubra todo el lienzo
-                scaled_image = imported_image.scaled(
-                    scaled_width,
-                    scaled_height,
-                    Qt.AspectRatioMode.KeepAspectRatio,
-                    Qt.TransformationMode.SmoothTransformation
-                )
+                if imported_image.size() == QSize(scaled_width, scaled_height):
+                    # Ya tiene el tamaño justo: no hace falta remuestrear
+                    scaled_image = imported_image
+                else:
+                    if imported_image.width() * imported_image.height() > 16 * scaled_width * scaled_height:
+                        # Imagen mucho más grande que el lienzo: una primera
+                        # pasada rápida al doble del tamaño final y el
+                        # suavizado solo sobre ese resultado
+                        imported_image = imported_image.scaled(
+                            scaled_width * 2,
+                            scaled_height * 2,
+                            Qt.AspectRatioMode.KeepAspectRatio,
+                            Qt.TransformationMode.FastTransformation
+                        )
+                    scaled_image = imported_image.scaled(
+                        scaled_width,
+                        scaled_height,
+                        Qt.AspectRatioMode.KeepAspectRatio,
+                        Qt.TransformationMode.SmoothTransformation
+                    )
 
                 # Calcular posiciones para centrar y recortar la imagen
-                x = (scaled_width - self.canvas.width()) // -2
-                y = (scaled_height - self.canvas.height()) // -2
+                x = (scaled_width - w) // -2
+                y = (scaled_height - h) // -2
 
                 # Dibujar la imagen escalada en el frame
                 painter = QPainter(frame)
@@ -2312,11 +3673,12 @@ class AnimationApp(QMainWindow):
                 painter.end()
 
                 # Agregar el frame a la nueva capa
-                new_layer.frames[self.canvas.current_frame] = frame
+                new_layer.set_frame(self.canvas.current_frame, frame)
                 
                 # Agregar la capa al canvas
                 self.canvas.layers.append(new_layer)
                 self.canvas.current_layer = len(self.canvas.layers) - 1
+                self.canvas._frames_grew(len(new_layer.frames))
 
                 # Actualizar la interfaz
                 self.canvas.draw_current_frame()
@@ -2350,11 +3712,16 @@ class AnimationApp(QMainWindow):
                     'background_color': self.canvas.background_color.name(),
                     'current_frame': self.canvas.current_frame,
                     'current_layer': self.canvas.current_layer,
-                    'layers': [layer.to_dict() for layer in self.canvas.layers]
+                    'layers': [layer.meta_dict() for layer in self.canvas.layers]
                 }
                 
-                with open(file_name, 'w') as f:
-                    json.dump(data, f)
+                # Zip sin compresión (los PNG ya vienen comprimidos): un
+                # manifiesto JSON pequeño y cada frame como un PNG aparte
+                with zipfile.ZipFile(file_name, 'w', zipfile.ZIP_STORED) as archive:
+                    archive.writestr('manifest.json', json_dumps(data))
+                    for layer_idx, layer in enumerate(self.canvas.layers):
+                        for frame_idx, png in enumerate(layer.frame_pngs()):
+                            archive.writestr(f"l{layer_idx}/f{frame_idx}.png", png)
                 
                 QMessageBox.information(self, "Éxito", "Archivo guardado correctamente")
                 
@@ -2375,39 +3742,7 @@ class AnimationApp(QMainWindow):
         
         if directory:
             try:
-                # Obtener el número total de frames
-                max_frames = max(len(layer.frames) for layer in self.canvas.layers) if self.canvas.layers else 0
-                
-                # Guardar cada frame
-                for frame_index in range(max_frames):
-                    # Crear imagen con el color de fondo
-                    frame_image = QImage(
-                        self.canvas.width(),
-                        self.canvas.height(),
-                        QImage.Format.Format_ARGB32_Premultiplied
-                    )
-                    frame_image.fill(self.canvas.background_color)
-                    
-                    # Configurar el painter
-                    painter = QPainter(frame_image)
-                    painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-                    
-                    # Dibujar cada capa visible desde abajo hacia arriba
-                    for layer in reversed(self.canvas.layers):  # Usar reversed para el orden correcto
-                        if layer.visible and frame_index in layer.frames:
-                            frame = layer.frames[frame_index]
-                            if not frame.isNull():
-                                painter.setOpacity(layer.opacity / 100.0)
-                                painter.drawImage(0, 0, frame)
-                    
-                    painter.end()
-                    
-                    # Crear nombre de archivo
-                    file_name = os.path.join(directory, f"frame_{frame_index:04d}.png")
-                    
-                    # Guardar imagen
-                    if not frame_image.save(file_name, "PNG"):
-                        raise Exception(f"Error al guardar el frame {frame_index}")
+                max_frames = self._export_frames(directory)
                 
                 QMessageBox.information(
                     self,
@@ -2422,6 +3757,67 @@ class AnimationApp(QMainWindow):
                     f"Error al exportar las imágenes: {str(e)}"
                 )
 
+    def _export_frames(self, directory):
+        """
+        Compone cada frame (capas visibles de abajo hacia arriba) y lo guarda
+        como frame_XXXX.png en directory. Codificar el PNG es casi todo el
+        trabajo y cada frame es independiente, así que se reparte en hilos.
+        Devuelve la cantidad de frames exportados.
+        """
+        size = self.canvas.size()
+        background = QColor(self.canvas.background_color)
+        
+        # Un lienzo por hilo, reutilizado en todos los frames que procese
+        buffers = threading.local()
+        with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as pool:
+            futures = [
+                pool.submit(self._render_and_save_frame, frame_index,
+                            os.path.join(directory, f"frame_{frame_index:04d}.png"),
+                            size, background, layers, buffers)
+                for frame_index, layers in enumerate(self._export_snapshots())
+            ]
+            # result() propaga el primer error de guardado
+            for future in futures:
+                future.result()
+        return len(futures)
+
+    def _export_snapshots(self):
+        """
+        Por cada frame, las capas visibles de abajo hacia arriba como
+        (opacidad, copia superficial del frame): quien compone no toca las
+        capas mientras la exportación está en curso.
+        """
+        for frame_index in range(self.canvas._max_frame_count):
+            layers = []
+            for layer in reversed(self.canvas.layers):  # Usar reversed para el orden correcto
+                frame = layer.frame_at(frame_index) if layer.visible else None
+                if frame is not None and not frame.isNull():
+                    layers.append((layer._opacity_f, QImage(frame)))
+            yield layers
+
+    @staticmethod
+    def _compose_export_frame(frame_image, background, layers):
+        # Rellenar con el color de fondo: el lienzo se reutiliza entre frames
+        frame_image.fill(background)
+        
+        # Sin Antialiasing: solo afecta a primitivas geométricas, no a drawImage
+        painter = QPainter(frame_image)
+        for opacity, frame in layers:
+            painter.setOpacity(opacity)
+            painter.drawImage(0, 0, frame)
+        painter.end()
+
+    @classmethod
+    def _render_and_save_frame(cls, frame_index, file_name, size, background, layers, buffers):
+        frame_image = getattr(buffers, 'image', None)
+        if frame_image is None:
+            frame_image = buffers.image = QImage(size, QImage.Format.Format_ARGB32_Premultiplied)
+        # save() no retiene el buffer
+        cls._compose_export_frame(frame_image, background, layers)
+        
+        if not frame_image.save(file_name, "PNG", EXPORT_PNG_QUALITY):
+            raise Exception(f"Error al guardar el frame {frame_index}")
+
     def export_video(self):
         """
         Exporta la animación como video MP4, combinando correctamente todas las capas visibles.
@@ -2439,67 +3835,54 @@ class AnimationApp(QMainWindow):
             "Video MP4 (*.mp4)"
         )
         
-        if file_name:
+        if file_name and self.canvas.layers:
+            # FFmpeg elige el contenedor por la extensión: sin ella no exporta
+            if not file_name.lower().endswith('.mp4'):
+                file_name += '.mp4'
+            size = self.canvas.size()
+            background = QColor(self.canvas.background_color)
+            fps = self.timeline_widget.speed_slider.value()
+            
+            # Los frames van crudos por stdin (bgra es el orden en memoria de
+            # ARGB32): FFmpeg codifica mientras se compone el siguiente y no
+            # pasa nada por disco
             try:
-                temp_dir = tempfile.mkdtemp()
-                
-                if self.canvas.layers:
-                    max_frames = max(len(layer.frames) for layer in self.canvas.layers)
-                    
-                    # Exportar frames
-                    for frame_idx in range(max_frames):
-                        # Crear imagen con el color de fondo
-                        frame_image = QImage(
-                            self.canvas.width(),
-                            self.canvas.height(),
-                            QImage.Format.Format_ARGB32_Premultiplied
-                        )
-                        frame_image.fill(self.canvas.background_color)
-                        
-                        # Configurar el painter
-                        painter = QPainter(frame_image)
-                        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-                        
-                        # Dibujar cada capa visible desde abajo hacia arriba
-                        for layer in reversed(self.canvas.layers):  # Usar reversed para el orden correcto
-                            if layer.visible and frame_idx in layer.frames:
-                                frame = layer.frames[frame_idx]
-                                if not frame.isNull():
-                                    painter.setOpacity(layer.opacity / 100.0)
-                                    painter.drawImage(0, 0, frame)
-                        
-                        painter.end()
-                        
-                        # Guardar frame temporal
-                        frame_file = os.path.join(temp_dir, f"frame_{frame_idx:04d}.png")
-                        if not frame_image.save(frame_file, "PNG"):
-                            raise Exception(f"Error al guardar el frame temporal {frame_idx}")
-                    
-                    # Crear video con FFmpeg
-                    try:
-                        fps = self.timeline_widget.speed_slider.value()
-                        subprocess.run([
-                            'ffmpeg',
-                            '-framerate', str(fps),
-                            '-i', os.path.join(temp_dir, 'frame_%04d.png'),
-                            '-c:v', 'libx264',
-                            '-pix_fmt', 'yuv420p',
-                            '-y',
-                            file_name
-                        ], check=True)
-                        QMessageBox.information(self, "Éxito", "Video exportado correctamente")
-                    except subprocess.CalledProcessError:
-                        QMessageBox.critical(self, "Error", "Error al ejecutar FFmpeg")
-                    except FileNotFoundError:
-                        QMessageBox.critical(self, "Error", "FFmpeg no encontrado. Por favor, instale FFmpeg")
-                    finally:
-                        # Limpiar archivos temporales
-                        shutil.rmtree(temp_dir)
-                        
+                encoder = subprocess.Popen([
+                    'ffmpeg',
+                    '-f', 'rawvideo',
+                    '-pix_fmt', 'bgra',
+                    '-s', f"{size.width()}x{size.height()}",
+                    '-framerate', str(fps),
+                    '-i', '-',
+                    '-c:v', 'libx264',
+                    '-pix_fmt', 'yuv420p',
+                    '-y',
+                    file_name
+                ], stdin=subprocess.PIPE)
+            except FileNotFoundError:
+                QMessageBox.critical(self, "Error", "FFmpeg no encontrado. Por favor, instale FFmpeg")
+                return
+            
+            try:
+                frame_image = QImage(size, QImage.Format.Format_ARGB32_Premultiplied)
+                with encoder.stdin:
+                    for layers in self._export_snapshots():
+                        self._compose_export_frame(frame_image, background, layers)
+                        ptr = frame_image.constBits()
+                        ptr.setsize(frame_image.sizeInBytes())
+                        encoder.stdin.write(ptr)
+                if encoder.wait() == 0:
+                    QMessageBox.information(self, "Éxito", "Video exportado correctamente")
+                else:
+                    QMessageBox.critical(self, "Error", "Error al ejecutar FFmpeg")
+            except BrokenPipeError:
+                # FFmpeg terminó antes de recibir todos los frames
+                encoder.wait()
+                QMessageBox.critical(self, "Error", "Error al ejecutar FFmpeg")
             except Exception as e:
+                encoder.kill()
+                encoder.wait()
                 QMessageBox.critical(self, "Error", f"Error al exportar el video: {str(e)}")
-                if 'temp_dir' in locals():
-                    shutil.rmtree(temp_dir)
     def show_color_dialog(self):
         color = QColorDialog.getColor(self.canvas.pen_color, self)
         if color.isValid():
@@ -2530,8 +3913,9 @@ class AnimationApp(QMainWindow):
         print("Ejecutando copia de frame")  # Debug
         if self.canvas.layers and self.canvas.current_layer < len(self.canvas.layers):
             layer = self.canvas.layers[self.canvas.current_layer]
-            if self.canvas.current_frame in layer.frames:
-                self.timeline_widget.copied_frame = layer.frames[self.canvas.current_frame].copy()
+            if self.canvas.current_frame < len(layer.frames):
+                # Copia superficial (copy-on-write); la copia real se hace al pegar
+                self.timeline_widget.copied_frame = QImage(layer.frames[self.canvas.current_frame])
                 print("Frame copiado exitosamente")  # Debug
                 
 
@@ -2540,7 +3924,8 @@ class AnimationApp(QMainWindow):
         if hasattr(self.timeline_widget, 'copied_frame') and self.timeline_widget.copied_frame:
             if self.canvas.layers and self.canvas.current_layer < len(self.canvas.layers):
                 layer = self.canvas.layers[self.canvas.current_layer]
-                layer.frames[self.canvas.current_frame] = self.timeline_widget.copied_frame.copy()
+                layer.set_frame(self.canvas.current_frame, self.timeline_widget.copied_frame.copy())
+                self.canvas._frames_grew(len(layer.frames))
                 self.timeline_widget.update_lists()
                 self.canvas.draw_current_frame()
                 print("Frame pegado exitosamente")  # Debug
@@ -2778,6 +4163,10 @@ class SelectionTool:
         self.rotating = False
         self.rotation_angle = 0
         self.rotation_origin = None
+        self._rx = 0.0
+        self._ry = 0.0
+        self._cx = 0.0
+        self._cy = 0.0
         self.rotation_start_angle = 0
         self.active_handle = None
         self.initial_rotation = 0
@@ -2803,6 +4192,9 @@ class SelectionTool:
         
         self.flipped_horizontal = False
         self.flipped_vertical = False
+        # Signo del manejador activo por eje: 1 (e/s), -1 (w/n), 0 (sin eje)
+        self._hx = 0
+        self._hy = 0
         
 
     def start_selection(self, pos):
@@ -2989,6 +4381,9 @@ class SelectionTool:
         self.active_handle = handle
         self.original_rect = self.selection_rect.copy()
         self.start_pos = pos
+        # Precalcular la dirección del manejador una sola vez por arrastre
+        self._hx = 1 if "e" in handle else (-1 if "w" in handle else 0)
+        self._hy = 1 if "s" in handle else (-1 if "n" in handle else 0)
 
     def update_scaling(self, pos):
         """Update selection size during scaling with flip functionality"""
@@ -2999,51 +4394,22 @@ class SelectionTool:
         dx = pos.x() - self.start_pos.x()
         dy = pos.y() - self.start_pos.y()
         
-        # Calcular nuevas dimensiones
-        new_x, new_y = ox, oy
-        new_width, new_height = ow, oh
-        
-        # Detectar flip basado en el movimiento del manejador
-        flip_horizontal = False
-        flip_vertical = False
-        
-        # Manejar escalado horizontal con flip
-        if "e" in self.active_handle:
-            if dx < -ow:  # Si se arrastra más allá del borde izquierdo
-                flip_horizontal = True
-                new_width = abs(dx + ow)
-            else:
-                new_width = max(1, ow + dx)
-        elif "w" in self.active_handle:
-            if dx > ow:  # Si se arrastra más allá del borde derecho
-                flip_horizontal = True
-                new_width = abs(dx - ow)
-                new_x = ox + ow - new_width
-            else:
-                new_width = max(1, ow - dx)
-                new_x = ox + dx
-        
-        # Manejar escalado vertical con flip
-        if "s" in self.active_handle:
-            if dy < -oh:  # Si se arrastra más allá del borde superior
-                flip_vertical = True
-                new_height = abs(dy + oh)
-            else:
-                new_height = max(1, oh + dy)
-        elif "n" in self.active_handle:
-            if dy > oh:  # Si se arrastra más allá del borde inferior
-                flip_vertical = True
-                new_height = abs(dy - oh)
-                new_y = oy + oh - new_height
-            else:
-                new_height = max(1, oh - dy)
-                new_y = oy + dy
+        # Calcular nuevas dimensiones con aritmética de signo:
+        # el borde opuesto al manejador queda fijo y un ancho negativo
+        # significa que se arrastró más allá de él (flip)
+        hx, hy = self._hx, self._hy
+        raw_w = ow + hx * dx
+        raw_h = oh + hy * dy
+        flip_horizontal = raw_w < 0
+        flip_vertical = raw_h < 0
+        new_width = max(1, abs(raw_w))
+        new_height = max(1, abs(raw_h))
+        new_x = ox + ow * (hx < 0) + min(0, hx * raw_w)
+        new_y = oy + oh * (hy < 0) + min(0, hy * raw_h)
         
         # Actualizar estado de flip
-        if flip_horizontal:
-            self.flipped_horizontal = not self.flipped_horizontal
-        if flip_vertical:
-            self.flipped_vertical = not self.flipped_vertical
+        self.flipped_horizontal ^= flip_horizontal
+        self.flipped_vertical ^= flip_vertical
         
         # Actualizar el rectángulo de selección
         self.selection_rect = [
@@ -3156,13 +4522,16 @@ class SelectionTool:
         if self.selection_rect:
             self.rotating = True
             x, y, w, h = self.selection_rect
-            # Convertir coordenadas a QPointF para cálculos precisos
             self.rotation_origin = QPointF(x + w/2, y + h/2)
-            pos_f = QPointF(float(pos.x()), float(pos.y()))
+            # Guardar el centro como floats para no crear QPointF por muestra
+            self._rx, self._ry = float(x + w/2), float(y + h/2)
+            # Centro local del contenido, constante durante todo el arrastre
+            self._cx, self._cy = w/2, h/2
             
-            # Calcular ángulo inicial
-            delta = pos_f - self.rotation_origin
-            self.rotation_start_angle = math.degrees(math.atan2(delta.y(), delta.x()))
+            # Calcular ángulo inicial (atan2 no necesita vector normalizado)
+            self.rotation_start_angle = math.atan2(
+                pos.y() - self._ry, pos.x() - self._rx
+            ) * RAD_TO_DEG
             self.initial_rotation = self.rotation_angle
 
 
@@ -3171,12 +4540,8 @@ class SelectionTool:
         if not self.rotating or not self.rotation_origin:
             return
             
-        # Convertir pos a QPointF para cálculos precisos
-        pos_f = QPointF(float(pos.x()), float(pos.y()))
-        
-        # Calcular nuevo ángulo
-        delta = pos_f - self.rotation_origin
-        current_angle = math.degrees(math.atan2(delta.y(), delta.x()))
+        # Calcular nuevo ángulo directamente con floats
+        current_angle = math.atan2(pos.y() - self._ry, pos.x() - self._rx) * RAD_TO_DEG
         angle_diff = current_angle - self.rotation_start_angle
         
         # Actualizar ángulo total
@@ -3184,15 +4549,27 @@ class SelectionTool:
         
         # Aplicar transformación si hay contenido seleccionado
         if self.selected_content:
-            transform = QTransform()
-            transform.translate(self.selection_rect[2]/2, self.selection_rect[3]/2)
-            transform.rotate(self.rotation_angle)
-            transform.translate(-self.selection_rect[2]/2, -self.selection_rect[3]/2)
+            transform = self._rotation_transform(self.rotation_angle, self._cx, self._cy)
             
             self.rotated_content = self.selected_content.transformed(
                 transform,
                 Qt.TransformationMode.SmoothTransformation
             )
+    @staticmethod
+    def _rotation_transform(angle, cx, cy):
+        """
+        Matriz de rotación alrededor de (cx, cy) construida en un solo paso.
+        Equivale a translate(cx, cy) + rotate(angle) + translate(-cx, -cy).
+        """
+        radians = math.radians(angle)
+        cos_a, sin_a = math.cos(radians), math.sin(radians)
+        return QTransform(
+            cos_a, sin_a,
+            -sin_a, cos_a,
+            cx - cos_a * cx + sin_a * cy,
+            cy - sin_a * cx - cos_a * cy
+        )
+
     def end_rotation(self):
         """Finalizar la rotación"""
         self.rotating = False
@@ -3274,7 +4651,7 @@ class SelectionTool:
 
     def apply_to_layer(self, layer, frame_index):
         """Apply selection to layer frame"""
-        if frame_index in layer.frames:
+        if frame_index < len(layer.frames):
             frame = layer.frames[frame_index]
             if self.selection_rect:
                 x, y, w, h = self.selection_rect
@@ -3289,7 +4666,7 @@ class SelectionTool:
 
     def apply_transform_to_layer(self, layer, frame_index):
         """Aplicar transformación con rotación a la capa"""
-        if frame_index in layer.frames and self.selected_content:
+        if frame_index < len(layer.frames) and self.selected_content:
             frame = layer.frames[frame_index]
             new_frame = QImage(
                 frame.size(),
@@ -3318,9 +4695,10 @@ class SelectionTool:
             
             if self.rotation_angle != 0:
                 # Aplicar rotación
-                painter.translate(x + w/2, y + h/2)
-                painter.rotate(self.rotation_angle)
-                painter.translate(-(x + w/2), -(y + h/2))
+                painter.setTransform(
+                    self._rotation_transform(self.rotation_angle, x + w/2, y + h/2),
+                    True
+                )
             
             if hasattr(self, 'rotated_content'):
                 painter.drawImage(x, y, self.rotated_content)
@@ -3405,7 +4783,7 @@ class CursorManager:
             return
             
         layer = self.canvas.layers[self.canvas.current_layer]
-        if self.canvas.current_frame not in layer.frames:
+        if self.canvas.current_frame >= len(layer.frames):
             return
             
         # Obtener color bajo el cursor